@@ -36,7 +36,10 @@ create table snippets (
   id integer DEFAULT nextval('snippets_id_seq') not null primary key,
   title text not null default ''::text,
   tags text[] not null,
-  description text not null default ''::text
+  description text not null default ''::text,
+  -- normalized title, description and tags, written by the pipeline
+  -- (prasegist/search/search.py data_flat)
+  data_flat text not null
 );
 
 create table blocks (
@@ -46,27 +49,21 @@ create table blocks (
   lines text[] not null,
   snippet_id integer not null,
   pos smallint not null,
+  -- normalized lang and lines, written by the pipeline
+  -- (prasegist/search/search.py lines_flat)
+  lines_flat text not null,
   constraint blocks_snippet_id_fkey foreign KEY (snippet_id) references public.snippets (id)
 );
 
 --indices - blocks
-create index lines_flat_ts on blocks using GIN (
-  to_tsvector('simple', array_to_string_immut(array[lang] ||lines))
-);
+create index lines_flat_ts on blocks using GIN (to_tsvector('simple', lines_flat));
 
-create index lines_flat_trgm on blocks using GIN (array_to_string_immut(array[lang] ||lines) gin_trgm_ops);
+create index lines_flat_trgm on blocks using GIN (lines_flat gin_trgm_ops);
 
 --indices - snippets
-create index snippet_flat_ts on snippets using GIN (
-  to_tsvector(
-    'simple',
-    array_to_string_immut (array[title, description] || tags)
-  )
-);
+create index snippet_flat_ts on snippets using GIN (to_tsvector('simple', data_flat));
 
-create index snippet_flat_trgm on snippets using GIN (
-  array_to_string_immut (array[title, description] || tags) gin_trgm_ops
-);
+create index snippet_flat_trgm on snippets using GIN (data_flat gin_trgm_ops);
 
 create type query_result as (
   id integer,
@@ -106,23 +103,18 @@ create type query_result as (
 -----------------------------------------------------------------------------------------------------------------------------
 -- blocks_trgm_query (IMPROVED)
 -----------------------------------------------------------------------------------------------------------------------------
+-- lines_flat is normalized (lowercase, single spaces) by the pipeline, so q is
+-- normalized the same way for ilike; both filters use lines_flat_trgm.
 create or replace function blocks_trgm_query (q text) returns setof query_result language sql stable as $$
-with
-base as (
+with matched_block as (
   select
     *,
-    array_to_string_immut(array[lang] ||lines) as flat
+    similarity(lines_flat, q) as sim,
+    lines_flat <-> q as dist
   from blocks
-),
-matched_block as (
-  select
-    *,
-    similarity(flat, q) as sim,
-    flat <-> q as dist
-  from base
   where
-    flat % q
-    or flat ilike '%' || q || '%'
+    lines_flat % q
+    or lines_flat ilike '%' || regexp_replace(lower(q), '\s+', ' ', 'g') || '%'
 )
 select
   s.id,
@@ -149,8 +141,7 @@ with matched_block as (
   select *
   from blocks
   where
-    to_tsvector('simple', array_to_string_immut(array[lang] ||lines))
-    @@ plainto_tsquery('simple', q)
+    to_tsvector('simple', lines_flat) @@ plainto_tsquery('simple', q)
 )
 select
   s.id,
@@ -168,12 +159,20 @@ $$;
 -----------------------------------------------------------------------------------------------------------------------------
 -- snippets_trgm_query (IMPROVED + WEIGHTED)
 -----------------------------------------------------------------------------------------------------------------------------
-create or replace function snippets_trgm_query (q text) returns setof query_result language sql stable as $$
+-- base narrows the table down through snippet_flat_trgm. Whenever a single
+-- field is similar to q (similarity >= t), q is at least as word-similar to
+-- data_flat, which holds that field, so the per-field filter below still sees
+-- every row it would have matched on the whole table.
+create or replace function snippets_trgm_query (q text) returns setof query_result language sql stable
+set pg_trgm.word_similarity_threshold = 0.3 as $$
 with base as (
   select
     *,
     array_to_string_immut(tags) as tags_flat
   from snippets
+  where
+    q <% data_flat
+    or data_flat ilike '%' || regexp_replace(lower(q), '\s+', ' ', 'g') || '%'
 ),
 matched_metadata as (
   select
@@ -222,10 +221,7 @@ with matched_metadata as (
   select *
   from snippets
   where
-    to_tsvector(
-      'simple',
-      array_to_string_immut(array[title, description] || tags)
-    ) @@ plainto_tsquery('simple', q)
+    to_tsvector('simple', data_flat) @@ plainto_tsquery('simple', q)
 )
 select
   mm.id,
@@ -269,7 +265,8 @@ create table temp_snippets (
   id integer DEFAULT nextval('snippets_id_seq') not null primary key,
   title text not null default ''::text,
   tags text[] not null,
-  description text not null default ''::text
+  description text not null default ''::text,
+  data_flat text not null
 );
 
 create table temp_blocks (
@@ -278,13 +275,14 @@ create table temp_blocks (
   lang text,
   lines text[] not null,
   pos smallint not null,
-  snippet_idx smallint not null default 1
+  snippet_idx smallint not null default 1,
+  lines_flat text not null
 );
 
 -- INSERT --------------------------------------------------------------------------
 
 -- 1) first populate 'snippets'
-insert into snippets(id, title, tags, description)
+insert into snippets(id, title, tags, description, data_flat)
 select * from temp_snippets;
 
 -- 2) then populate 'blcoks'
@@ -295,8 +293,8 @@ WITH a AS (
     FROM temp_snippets
     -- LIMIT 20
 )
-insert into blocks(type, lang,lines, snippet_id, pos)
-SELECT type,lang,lines,a.snippet_id,pos
+insert into blocks(type, lang,lines, snippet_id, pos, lines_flat)
+SELECT type,lang,lines,a.snippet_id,pos,lines_flat
 FROM temp_blocks tb
 JOIN a 
     ON tb.snippet_idx = a.snippet_idx;
@@ -24,23 +24,18 @@ create type query_result as (
 -----------------------------------------------------------------------------------------------------------------------------
 -- blocks_trgm_query (IMPROVED)
 -----------------------------------------------------------------------------------------------------------------------------
+-- lines_flat is normalized (lowercase, single spaces) by the pipeline, so q is
+-- normalized the same way for ilike; both filters use lines_flat_trgm.
 create or replace function blocks_trgm_query (q text) returns setof query_result language sql stable as $$
-with
-base as (
+with matched_block as (
   select
     *,
-    array_to_string_immut(array[lang] ||lines) as flat
+    similarity(lines_flat, q) as sim,
+    lines_flat <-> q as dist
   from blocks
-),
-matched_block as (
-  select
-    *,
-    similarity(flat, q) as sim,
-    flat <-> q as dist
-  from base
   where
-    flat % q
-    or flat ilike '%' || q || '%'
+    lines_flat % q
+    or lines_flat ilike '%' || regexp_replace(lower(q), '\s+', ' ', 'g') || '%'
 )
 select
   s.id,
@@ -67,8 +62,7 @@ with matched_block as (
   select *
   from blocks
   where
-    to_tsvector('simple', array_to_string_immut(array[lang] ||lines))
-    @@ plainto_tsquery('simple', q)
+    to_tsvector('simple', lines_flat) @@ plainto_tsquery('simple', q)
 )
 select
   s.id,
@@ -86,12 +80,20 @@ $$;
 -----------------------------------------------------------------------------------------------------------------------------
 -- snippets_trgm_query (IMPROVED + WEIGHTED)
 -----------------------------------------------------------------------------------------------------------------------------
-create or replace function snippets_trgm_query (q text) returns setof query_result language sql stable as $$
+-- base narrows the table down through snippet_flat_trgm. Whenever a single
+-- field is similar to q (similarity >= t), q is at least as word-similar to
+-- data_flat, which holds that field, so the per-field filter below still sees
+-- every row it would have matched on the whole table.
+create or replace function snippets_trgm_query (q text) returns setof query_result language sql stable
+set pg_trgm.word_similarity_threshold = 0.3 as $$
 with base as (
   select
     *,
     array_to_string_immut(tags) as tags_flat
   from snippets
+  where
+    q <% data_flat
+    or data_flat ilike '%' || regexp_replace(lower(q), '\s+', ' ', 'g') || '%'
 ),
 matched_metadata as (
   select
@@ -140,10 +142,7 @@ with matched_metadata as (
   select *
   from snippets
   where
-    to_tsvector(
-      'simple',
-      array_to_string_immut(array[title, description] || tags)
-    ) @@ plainto_tsquery('simple', q)
+    to_tsvector('simple', data_flat) @@ plainto_tsquery('simple', q)
 )
 select
   mm.id,
@@ -5,7 +5,8 @@ create table temp_snippets (
   id integer DEFAULT nextval('snippets_id_seq') not null primary key,
   title text not null default ''::text,
   tags text[] not null,
-  description text not null default ''::text
+  description text not null default ''::text,
+  data_flat text not null
 );
 
 create table temp_blocks (
@@ -14,14 +15,15 @@ create table temp_blocks (
   lang text,
   lines text[] not null,
   pos smallint not null,
-  snippet_idx smallint not null default 1
+  snippet_idx smallint not null default 1,
+  lines_flat text not null
 );
 
 -- 1) insert data into 'temp_snippets' and 'temp_blocks' manually via the gui
 
 
 -- 2) populate 'snippets'
-insert into snippets(id, title, tags, description)
+insert into snippets(id, title, tags, description, data_flat)
 select * from temp_snippets;
 
 -- 3) then populate 'blocks'
@@ -32,8 +34,8 @@ WITH a AS (
     FROM temp_snippets
     LIMIT 20
 )
-insert into blocks(type, lang,lines, snippet_id, pos)
-SELECT type,lang,lines,a.snippet_id,pos
+insert into blocks(type, lang,lines, snippet_id, pos, lines_flat)
+SELECT type,lang,lines,a.snippet_id,pos,lines_flat
 FROM temp_blocks tb
 JOIN a 
     ON tb.snippet_idx = a.snippet_idx;
\ No newline at end of file
@@ -16,8 +16,10 @@ create table snippets (
   id integer generated always as identity not null unique primary key,
   title text not null default ''::text,
   tags text[] not null,
-  description text not null default ''::text
-  -- data_flat text not null
+  description text not null default ''::text,
+  -- normalized title, description and tags, written by the pipeline
+  -- (prasegist/search/search.py data_flat)
+  data_flat text not null
 );
 
 create table blocks (
@@ -27,26 +29,19 @@ create table blocks (
   lines text[] not null,
   snippet_id integer not null,
   pos smallint not null,
-  -- lines_flat text not null,
+  -- normalized lang and lines, written by the pipeline
+  -- (prasegist/search/search.py lines_flat)
+  lines_flat text not null,
   constraint blocks_snippet_id_fkey foreign KEY (snippet_id) references public.snippets (id)
 );
 
 --indices - blocks
-create index lines_flat_ts on blocks using GIN (
-  to_tsvector('simple', array_to_string_immut(array[lang] ||lines))
-);
+create index lines_flat_ts on blocks using GIN (to_tsvector('simple', lines_flat));
 
-create index lines_flat_trgm on blocks using GIN (array_to_string_immut(array[lang] ||lines) gin_trgm_ops);
+create index lines_flat_trgm on blocks using GIN (lines_flat gin_trgm_ops);
 
 
 --indices - snippets
-create index snippet_flat_ts on snippets using GIN (
-  to_tsvector(
-    'simple',
-    array_to_string_immut (array[title, description] || tags)
-  )
-);
+create index snippet_flat_ts on snippets using GIN (to_tsvector('simple', data_flat));
 
-create index snippet_flat_trgm on snippets using GIN (
-  array_to_string_immut (array[title, description] || tags) gin_trgm_ops
-);
\ No newline at end of file
+create index snippet_flat_trgm on snippets using GIN (data_flat gin_trgm_ops);
\ No newline at end of file
@@ -2,6 +2,19 @@ import logging
 
 from rich.logging import RichHandler
 
+# instrumentation moved into the package (prasegist/shared/metrics.py) so the
+# installed CLI has it; re-exported for existing imports
+from prasegist.shared.metrics import (  # noqa: F401
+    METRICS_DIR,
+    StageMetrics,
+    counted,
+    instrument,
+    instrumented,
+    runs,
+    tally,
+    write_metrics,
+)
+
 logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger("app")
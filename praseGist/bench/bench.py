@@ -0,0 +1,200 @@
+"""
+Pipeline benchmarks over synthetic corpora (bench/corpus.py).
+
+For each scale the corpus is generated into a scratch directory, the stage
+modules are pointed at it, and every stage function is timed (best wall and
+CPU time of --repeat runs) and then run once more under tracemalloc for its
+peak allocation. Results go to a JSON file keyed by commit, so runs on
+different commits can be diffed.
+
+--workers N adds a parse_gist_par stage: the gist parsed across N processes
+(0 for every core) next to the serial parse_gist. Its peak allocation only
+covers the parent process.
+
+Run from praseGist/:
+    python -m bench.bench --scales 1 4 16 --repeat 3
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from bench.corpus import CorpusSpec, generate
+from check_dupes import check_dupes
+from prasegist.comments import parse_comments as parse_comments_module
+from prasegist.comments.parse_comments import parse_comments, save_comments
+from prasegist.gist import parse_gist as parse_gist_module
+from prasegist.gist.parse_gist import parse_gist, save_gist
+from prasegist.merge import merge as merge_module
+from prasegist.merge.merge import merge2
+from prasegist.rows import make_rows as make_rows_module
+from prasegist.rows import rows_to_csv as rows_to_csv_module
+from prasegist.rows.make_rows import build_rows, load_merged_gists
+from prasegist.rows.rows_to_csv import build_csv
+from prasegist.shared.columnar import save_rows
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCALES = [1, 4, 16]
+REPEAT = 3
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+@contextlib.contextmanager
+def redirect_artifacts(workdir: Path) -> Iterator[None]:
+    """Point every stage's artifact paths into workdir for the duration."""
+    paths = [
+        (parse_gist_module, "FILEPATH_PROCESSED", "gist.processed.json"),
+        (parse_comments_module, "FILEPATH_PROCESSED", "comments.processed.json"),
+        (merge_module, "GIST_PROCESSED", "gist.processed.json"),
+        (merge_module, "COMMENTS_PROCESSED", "comments.processed.json"),
+        (merge_module, "OUTPUT_FILE", "merged_gists.json"),
+        (make_rows_module, "MERGED_GISTS", "merged_gists.json"),
+        (make_rows_module, "OUTPUT_FILE", "rows.json"),
+        (rows_to_csv_module, "ROWS_JSON", "rows.json"),
+        (rows_to_csv_module, "SNIPPETS_CSV", "snippets.csv"),
+        (rows_to_csv_module, "BLOCKS_CSV", "blocks.csv"),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in paths]
+    try:
+        for module, name, filename in paths:
+            setattr(module, name, workdir / filename)
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+def measure(fn: Callable[[], Any], repeat: int = REPEAT) -> tuple[dict, Any]:
+    """
+    Returns:
+        tuple: {wall_s, cpu_s, peak_bytes} and fn's result from the last run.
+    """
+    wall = cpu = float("inf")
+    result = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            gc.collect()
+            w0, c0 = time.perf_counter(), time.process_time()
+            result = fn()
+            wall = min(wall, time.perf_counter() - w0)
+            cpu = min(cpu, time.process_time() - c0)
+
+        # separate run: tracemalloc slows allocation-heavy code down a lot
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"wall_s": wall, "cpu_s": cpu, "peak_bytes": peak}, result
+
+
+def run_scale(
+    spec: CorpusSpec, workdir: Path, repeat: int = REPEAT, workers: int | None = 1
+) -> dict:
+    gist, comments = generate(spec)
+    gist_lines = gist.splitlines(keepends=True)
+    bodies = [comment["body"] for comment in comments]
+    stages = {}
+
+    with redirect_artifacts(workdir):
+        stages["parse_gist"], tree = measure(lambda: parse_gist(gist_lines, workers=1), repeat)
+        if workers != 1:
+            stages["parse_gist_par"], _ = measure(
+                lambda: parse_gist(gist_lines, workers=workers), repeat
+            )
+        save_gist(tree)
+        stages["parse_comments"], parsed = measure(lambda: parse_comments(bodies), repeat)
+        save_comments(parsed)
+        stages["merge2"], merged = measure(merge2, repeat)
+
+        snippets = load_merged_gists()
+        stages["build_rows"], rows = measure(lambda: build_rows(snippets), repeat)
+        save_rows(rows, make_rows_module.OUTPUT_FILE)
+        stages["build_csv"], _ = measure(build_csv, repeat)
+        stages["check_dupes"], dupes = measure(lambda: check_dupes(snippets), repeat)
+
+    return {
+        "spec": asdict(spec),
+        "counts": {
+            "gist_lines": len(gist_lines),
+            "gist_bytes": len(gist.encode()),
+            "comments": len(comments),
+            "sections": len(merged),
+            "rows": len(rows),
+            "blocks": sum(len(row["blocks"]) for row in rows),
+            "duplicates": len(dupes),
+        },
+        "stages": stages,
+    }
+
+
+def run(
+    scales: list[int], base: CorpusSpec, repeat: int = REPEAT, workers: int | None = 1
+) -> dict:
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="prasegist-bench-") as tmp:
+        for scale in scales:
+            spec = base.scaled(scale)
+            print(f"scale {scale}: {spec.sections} sections, {spec.comments} comments")
+            result = run_scale(spec, Path(tmp), repeat, workers)
+            for name, stage in result["stages"].items():
+                print(
+                    f"  {name:<15} {stage['wall_s'] * 1000:9.2f} ms"
+                    f" {stage['peak_bytes'] / 1024:9.0f} KiB"
+                )
+            runs.append({"scale": scale, **result})
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "workers": workers,
+        "runs": runs,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="0 uses every core")
+    parser.add_argument("--out", type=Path, help="default: bench/results/<commit>.json")
+    args = parser.parse_args()
+
+    results = run(args.scales, CorpusSpec(seed=args.seed), args.repeat, args.workers or None)
+    out = args.out or RESULTS_DIR / f"{results['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {out}")
+    except (OSError, IOError) as file_err:
+        print(f"Error writing to {out}: {file_err}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Synthetic corpus for the benchmarks: a gist markdown file and a GitHub
+comments listing shaped like the real ones (see prasegist/gist/gist.md and
+prasegist/comments/comments.json).
+
+Every knob lives on CorpusSpec. Output is deterministic for a given spec.
+"""
+
+import random
+import string
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+
+from prasegist.merge.merge import TAG_TO_SECTION
+
+LANGS = ["bash", "python", "go", "typescript", "sql", "", "kotlin", "rust"]
+WORDS = (
+    "set get run build push pull config file path user shell env port image "
+    "pod node cache query index table commit branch merge status list map key"
+).split()
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    sections: int = 20  # top-level gist sections (# heading)
+    depth: int = 3  # deepest heading level in the gist
+    children: int = 3  # subsections per section, at every level
+    block_lines: int = 8  # mean lines per code block
+    comments: int = 100
+    duplicate_rate: float = 0.2  # comment code copied from a gist block
+    alias_rate: float = 0.3  # comment tags written as a TAG_TO_SECTION alias
+    seed: int = 0
+
+    def scaled(self, scale: int) -> "CorpusSpec":
+        return replace(self, sections=self.sections * scale, comments=self.comments * scale)
+
+
+def _word(rng: random.Random) -> str:
+    # mostly made-up identifiers, so unrelated blocks share about as few
+    # shingles as unrelated real code does
+    if rng.random() < 0.3:
+        return rng.choice(WORDS)
+    return "".join(rng.choices(string.ascii_lowercase + "_./-=", k=rng.randint(3, 10)))
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(_word(rng) for _ in range(n))
+
+
+def _code(rng: random.Random, mean_lines: int) -> list[str]:
+    count = max(1, int(rng.expovariate(1 / mean_lines)))
+    return [
+        f"{'  ' * rng.randint(0, 2)}{_sentence(rng, rng.randint(2, 8))}"
+        for _ in range(count)
+    ]
+
+
+def section_names(spec: CorpusSpec) -> list[str]:
+    """Canonical alias targets first, so aliased comment tags find a section."""
+    canonical = sorted(set(TAG_TO_SECTION.values()))
+    extra = [f"topic {i}" for i in range(max(0, spec.sections - len(canonical)))]
+    return (canonical + extra)[: spec.sections]
+
+
+def generate_gist(spec: CorpusSpec) -> tuple[str, list[tuple[str, list[str]]]]:
+    """
+    Returns:
+        tuple: The gist markdown and its code blocks as (lang, lines), for
+        generate_comments to copy from.
+    """
+    rng = random.Random(spec.seed)
+    names = section_names(spec)
+    out = ["# contents\n"]
+    out.extend(f"- [{name}](#{name.replace(' ', '-')})\n" for name in names)
+    blocks: list[tuple[str, list[str]]] = []
+
+    def subsections(level: int, prefix: str) -> None:
+        if level > spec.depth:
+            return
+        for i in range(spec.children):
+            out.append(f"\n{'#' * level} {prefix} {_sentence(rng, 4)} {i}\n")
+            if rng.random() < 0.5:
+                out.append(f"- {_sentence(rng, 6)}\n")
+            lang = rng.choice(LANGS)
+            lines = _code(rng, spec.block_lines)
+            blocks.append((lang, lines))
+            out.append(f"```{lang}\n")
+            out.extend(f"{line}\n" for line in lines)
+            out.append("```\n")
+            if rng.random() < 0.5:
+                subsections(level + 1, prefix)
+
+    for name in names:
+        out.append(f"\n# {name}\n")
+        subsections(2, name)
+    return "".join(out), blocks
+
+
+def generate_comments(
+    spec: CorpusSpec, gist_blocks: list[tuple[str, list[str]]]
+) -> list[dict]:
+    """Comments in the GitHub API shape, with the fields the pipeline reads."""
+    rng = random.Random(spec.seed + 1)
+    names = section_names(spec)
+    aliases: dict[str, list[str]] = {}
+    for alias, name in TAG_TO_SECTION.items():
+        aliases.setdefault(name, []).append(alias)
+
+    comments = []
+    for i in range(spec.comments):
+        tag = rng.choice(names)
+        if tag in aliases and rng.random() < spec.alias_rate:
+            tag = rng.choice(aliases[tag])
+        if gist_blocks and rng.random() < spec.duplicate_rate:
+            lang, lines = rng.choice(gist_blocks)
+        else:
+            lang, lines = rng.choice(LANGS), _code(rng, spec.block_lines)
+        body = "\r\n".join(
+            [f"- {tag}", f"- {_sentence(rng, 6)}", f"```{lang}", *lines, "```"]
+        )
+        stamp = (EPOCH + timedelta(seconds=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        comments.append(
+            {"id": i + 1, "created_at": stamp, "updated_at": stamp, "body": body}
+        )
+    return comments
+
+
+def generate(spec: CorpusSpec) -> tuple[str, list[dict]]:
+    """
+    Returns:
+        tuple: The gist markdown and the comments listing.
+    """
+    gist, blocks = generate_gist(spec)
+    return gist, generate_comments(spec, blocks)
@@ -0,0 +1,132 @@
+"""
+Startup time of the CLI (prasegist/cli.py) and what each command imports.
+
+Every case runs in a fresh interpreter under `python -X importtime`. Reported
+per case: the best wall time of --repeat runs, the total import time, and the
+heavy third-party packages that got loaded. A case loading a package it must
+not (e.g. requests for a parse-only stage) is a regression: the script prints
+it and exits non-zero, so it can gate a change the way a test would.
+
+Run from praseGist/:
+    python -m bench.startup --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bench.bench import RESULTS_DIR, git_commit
+
+ROOT = Path(__file__).parents[1]
+REPEAT = 5
+HEAVY = ["requests", "pydantic", "rich", "psycopg"]
+
+# case -> (code run in the fresh interpreter, packages it must not load).
+# Stage cases import what the stage's handler imports, without running it.
+CASES: dict[str, tuple[str, set[str]]] = {
+    "help": (
+        "import sys; sys.argv = ['prasegist', '--help']\n"
+        "from prasegist.cli import main\n"
+        "try: main()\n"
+        "except SystemExit: pass",
+        set(HEAVY),
+    ),
+    "gist": ("import prasegist.cli, prasegist.gist.parse_gist", set(HEAVY)),
+    "comments": ("import prasegist.cli, prasegist.comments.parse_comments", set(HEAVY)),
+    "merge": ("import prasegist.cli, prasegist.merge.merge", {"requests", "rich", "psycopg"}),
+    "rows": ("import prasegist.cli, prasegist.rows.rows_to_csv", set(HEAVY)),
+    "search": ("import prasegist.cli, prasegist.search.index_file", set(HEAVY)),
+    "fetch": ("import prasegist.cli, prasegist.fetch.fetch", {"pydantic", "rich", "psycopg"}),
+}
+
+
+def parse_importtime(stderr: str) -> tuple[float, set[str]]:
+    """
+    Returns:
+        tuple: Total import time in seconds (sum of the top-level imports)
+        and the names of every module imported.
+    """
+    total_us = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # nested imports are indented
+            total_us += int(cumulative)
+        modules.add(name.strip())
+    return total_us / 1e6, modules
+
+
+def run_case(code: str, repeat: int = REPEAT) -> dict:
+    wall = float("inf")
+    import_s = float("inf")
+    modules: set[str] = set()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+        )
+        wall = min(wall, time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        seconds, modules = parse_importtime(proc.stderr)
+        import_s = min(import_s, seconds)
+    heavy = sorted(p for p in HEAVY if p in modules)
+    return {"wall_s": wall, "import_s": import_s, "modules": len(modules), "heavy": heavy}
+
+
+def run(repeat: int = REPEAT) -> tuple[dict, list[str]]:
+    cases = {}
+    regressions = []
+    for name, (code, forbidden) in CASES.items():
+        result = run_case(code, repeat)
+        cases[name] = result
+        print(
+            f"  {name:<10} {result['wall_s'] * 1000:8.1f} ms wall"
+            f" {result['import_s'] * 1000:8.1f} ms import"
+            f"  {', '.join(result['heavy']) or '-'}"
+        )
+        for package in forbidden.intersection(result["heavy"]):
+            regressions.append(f"{name} imports {package}")
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "repeat": repeat,
+        "cases": cases,
+    }
+    return results, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--out", type=Path, help="default: bench/results/startup-<commit>.json")
+    args = parser.parse_args()
+
+    results, regressions = run(args.repeat)
+    out = args.out or RESULTS_DIR / f"startup-{results['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {out}")
+    except (OSError, IOError) as file_err:
+        print(f"Error writing to {out}: {file_err}")
+
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
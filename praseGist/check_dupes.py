@@ -1,29 +1,21 @@
 """Check merged_gists.json for duplicates."""
 import json
-from difflib import SequenceMatcher
+import sys
 from pathlib import Path
 
-SIMILARITY_THRESHOLD = 0.80
+from prasegist.shared.dupes import SIMILARITY_THRESHOLD, find_duplicates
 
-with open(Path(__file__).parent / "prasegist/merge/merged_gists.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-
-def similarity(a: str, b: str) -> float:
-    """Return similarity ratio between 0 and 1."""
-    if not a and not b:
-        return 1.0
-    if not a or not b:
-        return 0.0
-    return SequenceMatcher(None, a, b).ratio()
+MERGED_GISTS = Path(__file__).parent / "prasegist/merge/merged_gists.json"
 
 
 def get_code_signature(entry, normalize=False):
-    snippets = entry.get("snippets") or []
+    # merged sections keep code in "blocks"; older dumps used "snippets"/"code"
     parts = []
-    for snippet in snippets:
-        lines = snippet.get("code") or []
-        parts.append("".join(lines))
+    for block in entry.get("blocks") or []:
+        if block.get("type") == "code":
+            parts.append("".join(block.get("lines") or []))
+    for snippet in entry.get("snippets") or []:
+        parts.append("".join(snippet.get("code") or []))
     sig = "".join(parts)
     if normalize:
         sig = " ".join(sig.split())
@@ -42,25 +34,31 @@ def collect_entries(items, path="", normalize=False):
     return entries
 
 
-all_entries_norm = collect_entries(data, normalize=True)
-seen_entries: list[tuple[str, str, str]] = []  # (code_sig, path, name)
-duplicates_code: list[tuple[float, tuple[str, str], tuple[str, str]]] = []  # (ratio, original, dupe)
+def check_dupes(data, threshold=SIMILARITY_THRESHOLD, exact=False):
+    """
+    Only compares pairs MinHash/LSH proposes (see prasegist.shared.dupes), so a
+    near-duplicate that shares no band with its original can be missed: under
+    1% of pairs just above the threshold on the bench corpus, none in
+    merged_gists.json. exact=True (--exact) compares every pair, as the
+    pairwise scan did, and reports every pair at the threshold.
+    Returns:
+        list[tuple[float, tuple[str, str], tuple[str, str]]]: (ratio, original, dupe)
+    """
+    all_entries_norm = collect_entries(data, normalize=True)
+    return find_duplicates(
+        (((path, name), code_sig) for path, name, code_sig, _ in all_entries_norm),
+        threshold,
+        exact,
+    )
+
+
+if __name__ == "__main__":
+    with open(MERGED_GISTS, "r", encoding="utf-8") as f:
+        data = json.load(f)
 
-for path, name, code_sig, item in all_entries_norm:
-    if not code_sig:
-        continue
-    matched = None
-    for seen_sig, seen_path, seen_name in seen_entries:
-        ratio = similarity(code_sig, seen_sig)
-        if ratio >= SIMILARITY_THRESHOLD:
-            matched = (ratio, (seen_path, seen_name), (path, name))
-            break
-    if matched:
-        duplicates_code.append(matched)
-    else:
-        seen_entries.append((code_sig, path, name))
+    duplicates_code = check_dupes(data, exact="--exact" in sys.argv[1:])
 
-print(f"Duplicate pairs (>={SIMILARITY_THRESHOLD*100:.0f}% similar): {len(duplicates_code)}")
-for ratio, original, dupe in duplicates_code:
-    print(f"  {ratio*100:.1f}% match: {original} <-> {dupe}")
-    print("------------")
+    print(f"Duplicate pairs (>={SIMILARITY_THRESHOLD*100:.0f}% similar): {len(duplicates_code)}")
+    for ratio, original, dupe in duplicates_code:
+        print(f"  {ratio*100:.1f}% match: {original} <-> {dupe}")
+        print("------------")
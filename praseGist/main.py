@@ -1,41 +1,9 @@
-from prasegist.comments.parse_comments import (
-    load_comments,
-    _extract_body,
-    parse_comments,
-    save_comments,
-)
-from prasegist.gist.parse_gist import load_gist, save_gist, parse_gist
-from prasegist.merge.merge import merge2
-from prasegist.rows.make_rows import build_rows, make_rows
-from prasegist.rows.rows_to_csv import build_csv
+import sys
 
+import app_logging  # noqa: F401  (rich handler on the "app" logger)
+from prasegist.cli import main
 
-def gist_fucntions():
-    gist = load_gist()
-    tree = parse_gist(gist)
-    # x =json.dumps([asdict(s) for s in tree], indent=4)
-    # print(json.dumps(convert_tree(tree), indent=4))
-    # save_gist(convert_tree(tree))
-    save_gist(tree)
-
-
-def comments_functions():
-    comments = _extract_body(load_comments())
-    tree = parse_comments(comments)
-    save_comments(tree)
-
-
-def merge_functions():
-    merge2()
-
-
-def row_functions():
-    make_rows()
-    build_csv()
-
+# `python main.py [--force] [--fetch | --sync] [--load | --publish]` is
+# `prasegist run ...`; see prasegist/cli.py for the per-stage commands.
 if __name__ == "__main__":
-    gist_fucntions()
-    comments_functions()
-    merge_functions()
-    row_functions()
-    pass
+    main(["run", *sys.argv[1:]])
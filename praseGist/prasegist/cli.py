@@ -0,0 +1,297 @@
+"""
+Command line entry point (`prasegist`, or `python -m prasegist.cli`).
+
+    prasegist run [--force] [--jobs N] [--fetch | --sync] [--load | --publish]
+    prasegist gist | comments | merge | rows [--force]
+    prasegist fetch | sync | load | publish
+    prasegist watch [--interval SECONDS]
+    prasegist search QUERY...
+
+Every command imports the modules it runs inside its handler, and this module
+only imports the standard library and prasegist.shared helpers that do the
+same. So `prasegist gist` never loads requests, pydantic or rich, and
+`prasegist --help` loads none of the stages. bench/startup.py keeps it that
+way.
+
+`run` schedules the stages as a graph (stage_cache.run_graph): the gist
+branch (fetch_gist -> gist) and the comments branch (fetch_comments or sync ->
+comments) run side by side in threads and join at merge.
+"""
+
+import argparse
+import functools
+import logging
+from collections import deque
+
+from prasegist.shared.counters import counts
+from prasegist.shared.metrics import counted, instrument, instrumented, tally, write_metrics
+from prasegist.shared.paths import (
+    BLOCKS_CSV,
+    COMMENTS_FILEPATH,
+    COMMENTS_PROCESSED,
+    GIST_FILEPATH,
+    GIST_PROCESSED,
+    INDEX_FILE,
+    MERGED_GISTS,
+    ROWS_JSON,
+    SNIPPETS_CSV,
+)
+from prasegist.shared.stage_cache import Stage, StageCache, run_graph, run_stages
+
+
+##########
+# STAGES #
+##########
+@instrumented("gist")
+def gist_functions():
+    from prasegist.gist.parse_gist import iter_gist, parse_gist_stream, save_gist_stream
+
+    # streams one top-level section at a time; equivalent to
+    # save_gist(parse_gist(load_gist()))
+    save_gist_stream(tally(parse_gist_stream(counted(iter_gist(), "lines"))))
+
+
+@instrumented("comments")
+def comments_functions():
+    from prasegist.comments.parse_comments import (
+        _extract_body,
+        load_comments,
+        parse_comments,
+        save_comments,
+    )
+
+    comments = _extract_body(load_comments())
+    counts["lines"] += sum(body.count("\n") + 1 for body in comments)
+    tree = list(tally(parse_comments(comments)))
+    save_comments(tree)
+
+
+@instrumented("merge")
+def merge_functions():
+    from prasegist.merge.merge import merge2
+
+    deque(tally(merge2()), maxlen=0)
+
+
+@instrumented("rows")
+def row_functions():
+    from prasegist.rows.rows_to_csv import export_rows
+
+    # one pass: merged_gists.json -> rows.json + snippets.csv + blocks.csv
+    # + search.idx, equivalent to make_rows() then build_csv()
+    export_rows()
+
+
+# Each stage is skipped when its inputs (data files, and the source of the
+# modules it runs plus every prasegist module they import) hash to the same
+# fingerprint as the last run. deps on fetch_gist, fetch_comments and sync
+# only apply when `run` adds those stages.
+STAGES = [
+    Stage(
+        "gist",
+        gist_functions,
+        inputs=[GIST_FILEPATH],
+        modules=["prasegist.gist.parse_gist"],
+        outputs=[GIST_PROCESSED],
+        deps=["fetch_gist"],
+    ),
+    Stage(
+        "comments",
+        comments_functions,
+        inputs=[COMMENTS_FILEPATH],
+        modules=["prasegist.comments.parse_comments"],
+        outputs=[COMMENTS_PROCESSED],
+        deps=["fetch_comments", "sync"],
+    ),
+    Stage(
+        "merge",
+        merge_functions,
+        inputs=[GIST_PROCESSED, COMMENTS_PROCESSED],
+        modules=["prasegist.merge.merge"],
+        outputs=[MERGED_GISTS],
+        deps=["gist", "comments"],
+    ),
+    Stage(
+        "rows",
+        row_functions,
+        inputs=[MERGED_GISTS],
+        modules=["prasegist.rows.rows_to_csv"],
+        outputs=[ROWS_JSON, SNIPPETS_CSV, BLOCKS_CSV, INDEX_FILE],
+        deps=["merge"],
+    ),
+]
+
+
+def stage(name: str) -> Stage:
+    return next(s for s in STAGES if s.name == name)
+
+
+def fetch_functions():
+    from prasegist.fetch.fetch import fetch
+
+    with instrument("fetch"):
+        fetch()
+
+
+def fetch_gist_functions():
+    from prasegist.fetch.fetch import fetch_gist_only
+
+    with instrument("fetch_gist"):
+        fetch_gist_only()
+
+
+def fetch_comments_functions():
+    from prasegist.fetch.fetch import fetch_comments_only
+
+    with instrument("fetch_comments"):
+        fetch_comments_only()
+
+
+def sync_functions(cache: StageCache):
+    from prasegist.comments.sync_comments import sync_comments
+
+    # sync_comments reparses changed comments itself, so an up-to-date
+    # comments stage stays up to date afterwards
+    with instrument("sync"):
+        comments = stage("comments")
+        was_fresh = cache.is_fresh(comments)
+        if sync_comments() and was_fresh:
+            cache.record(comments)
+            cache.save()
+
+
+def load_functions():
+    from prasegist.db.load import load_db
+
+    with instrument("load"):
+        load_db()
+
+
+def publish_functions():
+    from prasegist.db.sync import sync_db
+
+    with instrument("publish"):
+        sync_db()
+
+
+############
+# COMMANDS #
+############
+def cmd_run(args: argparse.Namespace) -> None:
+    cache = StageCache()
+    graph = list(STAGES)
+    if args.fetch:
+        graph += [
+            Stage("fetch_gist", fetch_gist_functions, outputs=[GIST_FILEPATH], cached=False),
+            Stage(
+                "fetch_comments",
+                fetch_comments_functions,
+                outputs=[COMMENTS_FILEPATH],
+                cached=False,
+            ),
+        ]
+    elif args.sync:
+        graph.append(Stage("sync", functools.partial(sync_functions, cache), cached=False))
+    run_graph(graph, force=args.force, cache=cache, workers=args.jobs)
+    if args.load:
+        load_functions()
+    elif args.publish:
+        publish_functions()
+
+
+def cmd_stage(args: argparse.Namespace) -> None:
+    run_stages([stage(args.command)], force=args.force)
+
+
+def cmd_fetch(args: argparse.Namespace) -> None:
+    fetch_functions()
+
+
+def cmd_sync(args: argparse.Namespace) -> None:
+    sync_functions(StageCache())
+
+
+def cmd_load(args: argparse.Namespace) -> None:
+    load_functions()
+
+
+def cmd_publish(args: argparse.Namespace) -> None:
+    publish_functions()
+
+
+def cmd_watch(args: argparse.Namespace) -> None:
+    from prasegist.watch import watch
+
+    watch(args.interval, STAGES)
+
+
+def cmd_search(args: argparse.Namespace) -> None:
+    from prasegist.search.index_file import MappedIndex
+
+    query = " ".join(args.query)
+    with MappedIndex() as index:
+        results = index.blocks_fts_query(query) if args.blocks else index.snippets_fts_query(query)
+        for result in results[: args.limit]:
+            print(result.id, result.tags, result.title, result.pos)
+
+
+def positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="prasegist", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    run = commands.add_parser("run", help="run every stage that is out of date")
+    run.add_argument("--force", action="store_true", help="ignore the stage cache")
+    run.add_argument("--jobs", type=positive_int, help="most stages run at once (default: no limit)")
+    before = run.add_mutually_exclusive_group()
+    before.add_argument("--fetch", action="store_true", help="fetch the gist and comments first")
+    before.add_argument("--sync", action="store_true", help="sync changed comments first")
+    after = run.add_mutually_exclusive_group()
+    after.add_argument("--load", action="store_true", help="load the rows into the database")
+    after.add_argument("--publish", action="store_true", help="publish changed rows to the database")
+    run.set_defaults(handler=cmd_run)
+
+    for s in STAGES:
+        sub = commands.add_parser(s.name, help=f"run the {s.name} stage if it is out of date")
+        sub.add_argument("--force", action="store_true", help="ignore the stage cache")
+        sub.set_defaults(handler=cmd_stage)
+
+    for name, handler, help_ in [
+        ("fetch", cmd_fetch, "fetch the gist and all comments"),
+        ("sync", cmd_sync, "fetch and reparse only changed comments"),
+        ("load", cmd_load, "load the rows into the database"),
+        ("publish", cmd_publish, "publish changed rows to the database"),
+    ]:
+        commands.add_parser(name, help=help_).set_defaults(handler=handler)
+
+    watch = commands.add_parser("watch", help="rebuild on every change to the gist or comments")
+    watch.add_argument("--interval", type=float, default=0.25, help="seconds between checks")
+    watch.set_defaults(handler=cmd_watch)
+
+    search = commands.add_parser("search", help="query the search index")
+    search.add_argument("query", nargs="+")
+    search.add_argument("--blocks", action="store_true", help="match blocks instead of snippets")
+    search.add_argument("--limit", type=int, default=20)
+    search.set_defaults(handler=cmd_search)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        args = build_parser().parse_args(["run"])
+    # main.py sets up rich logging on the "app" logger; plain logging otherwise
+    if not logging.getLogger("app").handlers:
+        logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    args.handler(args)
+    write_metrics()
+
+
+if __name__ == "__main__":
+    main()
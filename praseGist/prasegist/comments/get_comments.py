@@ -1,12 +1,11 @@
 import time
 import requests
 import json
-from pathlib import Path
 
-GIST_ID = "c7a6bfca57631a4c45e2c75b7b5f881e"
-URL = f"https://api.github.com/gists/{GIST_ID}/comments"
-FILENAME = "comments.json"
-FILEPATH = Path(__file__).parent / FILENAME
+from prasegist.shared.paths import COMMENTS_FILEPATH as FILEPATH
+from prasegist.shared.paths import COMMENTS_URL as URL
+
+FILENAME = FILEPATH.name
 headers = {
     "Accept": "application/vnd.github+json",
     "X-GitHub-Api-Version": "2022-11-28",
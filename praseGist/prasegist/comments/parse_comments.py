@@ -1,11 +1,21 @@
 import json
+import os
 
-from prasegist.comments.get_comments import FILEPATH
-from prasegist.shared.shared import CodeBlock, Section, TextBlock, block_hash
+from prasegist.shared.columnar import save_sections
+from prasegist.shared.counters import hot
+from prasegist.shared.lines import LineKind, Token, tokenize
+from prasegist.shared.paths import COMMENTS_FILEPATH as FILEPATH
+from prasegist.shared.paths import COMMENTS_PROCESSED as FILEPATH_PROCESSED
+from prasegist.shared.shared import CodeRecord, SectionRecord, TextRecord, block_hash, dump_section
+from prasegist.shared.util import process_pool
 
 
 # FILEPATH = FILEPATH.parent / "test_comments.json"
-FILEPATH_PROCESSED = FILEPATH.with_suffix(".processed.json")
+
+# parse_comments defaults; WORKERS = None (PRASEGIST_COMMENTS_WORKERS=0) uses
+# every core, 1 parses serially
+WORKERS: int | None = int(os.environ.get("PRASEGIST_COMMENTS_WORKERS", "1")) or None
+CHUNKSIZE = 64
 
 
 def load_comments() -> list[dict]:
@@ -35,50 +45,32 @@ def _extract_body(comments: list[dict]) -> list[str]:
     return [comment["body"] for comment in comments]
 
 
-class parseFunctions:
-    @staticmethod
-    def is_codeblock(line: str) -> bool:
-        return line.strip().startswith("```")
-
-    @staticmethod
-    def is_bullet(line: str) -> bool:
-        return line.strip().startswith("- ")
-
-    @staticmethod
-    def extract_bullet(line: str) -> str:
-        return line.strip()[2:].strip()
-
-    @staticmethod
-    def extract_codeblock_lang(line: str) -> str:
-        return line.strip().replace("`", "").strip() or ""
-
-
 class Context:
     def __init__(self, line_gen=None):
-        self.section: Section | None = None
+        self.section: SectionRecord | None = None
         self.is_codeblock: bool = False
-        self.codeblock: CodeBlock | None = None
+        self.codeblock: CodeRecord | None = None
+        self.current_token: Token | None = None
         self.current_line: str | None = None
         self.generator = line_gen
 
     def _ensure_section(self, name: str = "misc"):
         if self.section is None:
-            self.section = Section(name=name, level=1, blocks=[], children=[])
+            self.section = SectionRecord(name, 1)
 
     def section_add(self, name: str):
-        self.section = Section(name=name, level=1, blocks=[], children=[])
+        self.section = SectionRecord(name, 1)
 
     def other_add(self, text: str):
         self._ensure_section()
         if self.section is not None:
-            textblock = TextBlock(lines=[text])
+            textblock = TextRecord([text])
             self.section.blocks.append(textblock)
             textblock.hashes.append(block_hash(textblock))
 
-    def start_codeblock(self, line: str):
+    def start_codeblock(self, lang: str):
         self._ensure_section()
-        lang = parseFunctions.extract_codeblock_lang(line)
-        self.codeblock = CodeBlock(lang=lang)
+        self.codeblock = CodeRecord(lang)
         if self.section is not None:
             self.section.blocks.append(self.codeblock)
         self.is_codeblock = True
@@ -96,31 +88,31 @@ class Context:
         if self.generator is None:
             return None
         try:
-            self.current_line = next(self.generator)
+            self.current_token = next(self.generator)
+            self.current_line = self.current_token.line
+            if hot.enabled:
+                hot["comments.lines"] += 1
             return self.current_line
         except StopIteration:
+            self.current_token = None
             self.current_line = None
             return None
 
 
-def parse_comment_to_section(lines: list[str]) -> Section:
+def parse_comment_to_section(lines: list[str]) -> SectionRecord:
     """
-    Parse comment body lines into a Section.
+    Parse comment body lines into a SectionRecord.
     - First bullet (- item) becomes section name
     - Subsequent bullets become other
     - ```lang ... ``` blocks become code
     """
 
-    def line_generator():
-        for line in lines:
-            yield line
-
-    context = Context(line_generator())
+    context = Context(tokenize(lines))
     while context.next() is not None:
         parse_section(context)
 
     if context.section is None:
-        return Section(name="misc", level=1, blocks=[], children=[])
+        return SectionRecord("misc", 1)
     return context.section
 
 
@@ -131,51 +123,55 @@ def parse_section(context: Context):
 
 
 def handle_codeblock(context: Context):
-    if parseFunctions.is_codeblock(context.current_line):
+    if context.current_token.kind == LineKind.FENCE:
         context.end_codeblock()
         return
     context.code_add(context.current_line)
 
 
 def handle_line(context: Context):
-    line = context.current_line
+    kind, _, text, _ = context.current_token
 
-    if parseFunctions.is_codeblock(line):
-        context.start_codeblock(line)
+    if kind == LineKind.FENCE:
+        context.start_codeblock(text)
         return
 
-    if parseFunctions.is_bullet(line):
-        bullet_text = parseFunctions.extract_bullet(line)
+    if kind == LineKind.BULLET:
         if context.section is None:
-            context.section_add(bullet_text)
+            context.section_add(text)
         else:
-            context.other_add(bullet_text)
+            context.other_add(text)
+
+
+def parse_comment_body(comment: str) -> SectionRecord:
+    return parse_comment_to_section([line.replace("\r", "") for line in comment.split("\n")])
 
 
-def parse_comments(comments: list[str]) -> list[Section]:
+def parse_comments(
+    comments: list[str], workers: int | None = WORKERS, chunksize: int = CHUNKSIZE
+) -> list[SectionRecord]:
     """
-    Parse comment bodies into list[Section]. Each body is split into lines first.
+    Parse comment bodies into list[SectionRecord]. Each body is split into lines first.
+    With more than one worker the bodies are parsed in chunks of `chunksize`
+    across a process pool; the output keeps the input order.
     Returns:
-        list[Section]: The parsed comments as Sections (same structure as gist).
+        list[SectionRecord]: The parsed comments as Sections (same structure as gist).
     """
-    return [
-        parse_comment_to_section([line.replace("\r", "") for line in c.split("\n")])
-        for c in comments
-    ]
+    if (workers is not None and workers <= 1) or len(comments) <= chunksize:
+        return [parse_comment_body(c) for c in comments]
 
+    with process_pool(workers) as pool:
+        return list(pool.map(parse_comment_body, comments, chunksize=chunksize))
 
-def save_comments(tree: list[Section]) -> None:
+
+def save_comments(tree: list[SectionRecord], validate: bool = False) -> None:
     """
     Save comments to FILEPATH_PROCESSED.
-    Uses model_dump (same as gist save_gist).
+    Uses dump_section (same as gist save_gist).
     Returns:
         None
     """
-    try:
-        with open(FILEPATH_PROCESSED, "w", encoding="utf-8") as f:
-            json.dump([s.model_dump(mode="json", by_alias=True) for s in tree], f, indent=4)
-    except (OSError, IOError) as file_err:
-        print(f"Error writing to {FILEPATH_PROCESSED}: {file_err}")
+    save_sections((dump_section(s, validate) for s in tree), FILEPATH_PROCESSED)
 
 
 if __name__ == "__main__":
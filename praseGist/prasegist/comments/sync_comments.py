@@ -0,0 +1,135 @@
+"""
+Incremental comment sync.
+
+comments.json is the local store: comments keyed by id, each with its
+updated_at. A sync asks the API only for comments updated after the newest
+updated_at in the store (the watermark), merges them in, and reparses only
+the bodies that are new or edited. Every other entry of
+comments.processed.json is reused as-is, so the cost of a refresh follows the
+number of changes rather than the size of the history.
+
+The gist comments API may ignore `since` and return every comment. That is
+detected (some returned comment is strictly older than the watermark, or every
+stored comment came back) and the response is then treated as the full
+listing, so deleted comments are dropped too. `since` is inclusive, so a delta
+may hold the watermark comment itself.
+"""
+
+import asyncio
+import json
+
+from prasegist.comments.parse_comments import (
+    FILEPATH,
+    FILEPATH_PROCESSED,
+    load_comments,
+    parse_comments,
+)
+from prasegist.shared.columnar import load_sections, save_sections
+from prasegist.fetch.fetch import CONCURRENCY, Fetcher
+from prasegist.shared.paths import COMMENTS_URL as URL
+from prasegist.shared.shared import dump_section
+from prasegist.shared.util import replacing
+
+
+def load_comments_processed() -> list[dict]:
+    try:
+        return load_sections(FILEPATH_PROCESSED)
+    except (OSError, IOError, ValueError):
+        return []
+
+
+def watermark(comments: list[dict]) -> str | None:
+    """Newest updated_at in the store (ISO 8601 strings sort chronologically)."""
+    return max((c["updated_at"] for c in comments), default=None)
+
+
+def is_full_listing(store: list[dict], fetched: list[dict], since: str) -> bool:
+    """Whether the API ignored `since` and returned every comment."""
+    if any(c["updated_at"] < since for c in fetched):
+        return True
+    fetched_ids = {c["id"] for c in fetched}
+    return all(c["id"] in fetched_ids for c in store)
+
+
+def merge_comments(
+    store: list[dict], fetched: list[dict], since: str | None
+) -> list[dict]:
+    """
+    Merge fetched comments into the store. Edited comments keep their place,
+    new ones are appended. A full listing replaces the store outright.
+    """
+    if since is None or is_full_listing(store, fetched, since):
+        return fetched
+    by_id = {c["id"]: c for c in store}
+    by_id.update({c["id"]: c for c in fetched})
+    return list(by_id.values())
+
+
+def sync_processed(
+    store: list[dict], processed: list[dict], comments: list[dict]
+) -> tuple[list[dict], int]:
+    """
+    Build comments.processed.json for `comments`, reusing the processed entry
+    of every comment whose updated_at is unchanged since `store`.
+    Returns:
+        tuple: The processed entries and how many bodies were reparsed.
+    """
+    if len(processed) != len(store):
+        # processed file is out of step with the store, reparse everything
+        processed = [None] * len(store)
+    previous = {c["id"]: (c["updated_at"], p) for c, p in zip(store, processed)}
+
+    out: list[dict | None] = []
+    stale: list[int] = []
+    for i, comment in enumerate(comments):
+        updated_at, entry = previous.get(comment["id"], (None, None))
+        if entry is None or updated_at != comment["updated_at"]:
+            stale.append(i)
+        out.append(entry)
+
+    for i, section in zip(stale, parse_comments([comments[i]["body"] for i in stale])):
+        out[i] = dump_section(section)
+    return out, len(stale)
+
+
+def sync_comments(url: str = URL, concurrency: int = CONCURRENCY) -> bool:
+    """
+    Sync comments.json and comments.processed.json with the API.
+    Returns:
+        bool: Whether anything changed.
+    """
+    store = load_comments()
+    since = watermark(store)
+
+    async def fetch():
+        fetcher = Fetcher(concurrency)
+        try:
+            return await fetcher.fetch_comments(url, since=since)
+        finally:
+            fetcher.close()
+
+    fetched = asyncio.run(fetch())
+    if fetched is None:
+        return False
+
+    comments = merge_comments(store, fetched, since)
+    processed, reparsed = sync_processed(store, load_comments_processed(), comments)
+    deleted = len({c["id"] for c in store} - {c["id"] for c in comments})
+    print(f"Comments: {len(comments)} total, {reparsed} reparsed, {deleted} deleted")
+
+    if reparsed == 0 and deleted == 0 and len(comments) == len(store):
+        return False
+
+    # the watcher and the comments stage read comments.json; never leave it
+    # half written
+    try:
+        with replacing(FILEPATH) as tmp, open(tmp, "w") as f:
+            json.dump(comments, f, indent=4)
+    except (OSError, IOError) as file_err:
+        print(f"Error writing synced comments: {file_err}")
+    save_sections(processed, FILEPATH_PROCESSED)
+    return True
+
+
+if __name__ == "__main__":
+    sync_comments()
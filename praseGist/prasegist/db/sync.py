@@ -0,0 +1,190 @@
+"""
+Differential database sync: publish only the rows that changed since the last
+publish, instead of dropping and reseeding snippets / blocks.
+
+Each row is keyed by a stable identity (tag path + title, with an ordinal for
+repeated titles under the same tags) and fingerprinted by its content
+(description and each block's type, lang and lines). PUBLISHED_FILE records,
+for every key published so far, its snippets.id and fingerprint. A sync diffs
+the current rows against it and applies the inserts, updates and deletes in a
+single transaction, so index maintenance and search downtime scale with the
+size of the change.
+
+The first sync (no PUBLISHED_FILE yet) reseeds the tables with db.load and
+records the result, as does every `load` (load_db). A reseed that does not
+record (load_rows) removes PUBLISHED_FILE, so the ids in it are never stale.
+"""
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+from prasegist.db.load import (
+    DATABASE_URL,
+    copy_blocks,
+    copy_snippets,
+    get_pool,
+    load_rows,
+    reserve_ids,
+)
+from prasegist.rows.make_rows import iter_rows, load_merged_gists
+from prasegist.search.search import data_flat
+from prasegist.shared.paths import PUBLISHED_FILE
+from prasegist.shared.shared import fastHash
+
+
+@dataclass
+class RowDiff:
+    inserts: list[tuple[str, dict]] = field(default_factory=list)
+    updates: list[tuple[str, int, dict]] = field(default_factory=list)
+    deletes: list[tuple[str, int]] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.inserts or self.updates or self.deletes)
+
+
+def row_keys(rows: Iterable[dict]) -> dict[str, dict]:
+    """Key every row by tag path + title (+ ordinal), keeping row order."""
+    keyed = {}
+    seen: dict[str, int] = {}
+    for row in rows:
+        base = json.dumps([row["tags"], row["title"]], ensure_ascii=False)
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        keyed[f"{base}#{n}"] = row
+    return keyed
+
+
+def row_fingerprint(row: dict) -> str:
+    content = [row["description"]] + [
+        [block["type"], block.get("lang"), block["lines"]] for block in row["blocks"]
+    ]
+    return fastHash(json.dumps(content, ensure_ascii=False))
+
+
+def load_published(path: Path = PUBLISHED_FILE) -> dict[str, dict] | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, IOError, json.JSONDecodeError):
+        return None
+
+
+def save_published(published: dict[str, dict], path: Path = PUBLISHED_FILE) -> None:
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(published, f, indent=2)
+    except (OSError, IOError) as file_err:
+        print(f"Error writing to {path}: {file_err}")
+
+
+def diff_rows(keyed: dict[str, dict], published: dict[str, dict]) -> RowDiff:
+    diff = RowDiff()
+    for key, row in keyed.items():
+        entry = published.get(key)
+        if entry is None:
+            diff.inserts.append((key, row))
+        elif entry["fingerprint"] != row_fingerprint(row):
+            diff.updates.append((key, entry["id"], row))
+    for key, entry in published.items():
+        if key not in keyed:
+            diff.deletes.append((key, entry["id"]))
+    return diff
+
+
+def apply_diff(cur, diff: RowDiff) -> dict[str, int]:
+    """
+    Apply the diff. Updated snippets keep their id; their blocks are replaced.
+    Returns:
+        dict[str, int]: key -> snippets.id of every inserted row.
+    """
+    delete_ids = [snippet_id for _, snippet_id in diff.deletes]
+    update_ids = [snippet_id for _, snippet_id, _ in diff.updates]
+
+    if delete_ids or update_ids:
+        cur.execute(
+            "delete from blocks where snippet_id = any(%s)", (delete_ids + update_ids,)
+        )
+    if delete_ids:
+        cur.execute("delete from snippets where id = any(%s)", (delete_ids,))
+    for _, snippet_id, row in diff.updates:
+        cur.execute(
+            "update snippets set title = %s, tags = %s, description = %s,"
+            " data_flat = %s where id = %s",
+            (row["title"], row["tags"], row["description"], data_flat(row), snippet_id),
+        )
+
+    insert_rows = [row for _, row in diff.inserts]
+    insert_ids = reserve_ids(cur, len(insert_rows))
+    copy_snippets(cur, insert_rows, insert_ids)
+    copy_blocks(
+        cur,
+        insert_rows + [row for _, _, row in diff.updates],
+        insert_ids + update_ids,
+    )
+    return {key: snippet_id for (key, _), snippet_id in zip(diff.inserts, insert_ids)}
+
+
+def reseed(
+    keyed: dict[str, dict], conninfo: str = DATABASE_URL, path: Path = PUBLISHED_FILE
+) -> dict[int, int]:
+    """
+    Reload the tables with every row and record the new ids in `path`.
+    Returns:
+        dict[int, int]: snippet_idx -> snippets.id, as from load_rows.
+    """
+    ids = load_rows(keyed.values(), conninfo=conninfo, published=path)
+    save_published(
+        {
+            key: {"id": ids[idx], "fingerprint": row_fingerprint(row)}
+            for idx, (key, row) in enumerate(keyed.items(), start=1)
+        },
+        path,
+    )
+    return ids
+
+
+def sync_rows(
+    rows: Iterable[dict], conninfo: str = DATABASE_URL, path: Path = PUBLISHED_FILE
+) -> RowDiff | None:
+    """
+    Publish rows to the database, sending only what changed.
+    Returns:
+        RowDiff | None: The applied diff, or None when the tables were reseeded.
+    """
+    keyed = row_keys(rows)
+    published = load_published(path)
+
+    if published is None:
+        reseed(keyed, conninfo, path)
+        return None
+
+    diff = diff_rows(keyed, published)
+    if diff:
+        with get_pool(conninfo).connection() as conn:
+            with conn.transaction(), conn.cursor() as cur:
+                inserted = apply_diff(cur, diff)
+
+        for key, _ in diff.deletes:
+            del published[key]
+        for key, snippet_id, row in diff.updates:
+            published[key] = {"id": snippet_id, "fingerprint": row_fingerprint(row)}
+        for key, row in diff.inserts:
+            published[key] = {"id": inserted[key], "fingerprint": row_fingerprint(row)}
+        save_published(published, path)
+
+    print(
+        f"Synced: {len(diff.inserts)} inserted, {len(diff.updates)} updated, "
+        f"{len(diff.deletes)} deleted"
+    )
+    return diff
+
+
+def sync_db(conninfo: str = DATABASE_URL) -> RowDiff | None:
+    """Publish merged_gists.json to the database."""
+    return sync_rows(iter_rows(load_merged_gists()), conninfo=conninfo)
+
+
+if __name__ == "__main__":
+    sync_db()
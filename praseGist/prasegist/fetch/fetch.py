@@ -0,0 +1,304 @@
+"""
+Fetch the raw gist and all of its comment pages concurrently.
+
+- Requests share one pooled requests.Session and run in worker threads under an
+  asyncio semaphore, so at most `concurrency` are in flight.
+- Rate-limit headers (Retry-After, X-RateLimit-Remaining/Reset) pause new
+  requests until the limit resets instead of sleeping a fixed time per page.
+- ETags are kept in CACHE_FILE with the last body, so unchanged pages are
+  revalidated with If-None-Match and cost a 304. A fetcher saves only the
+  entries it updated, so fetchers running side by side (fetch_gist_only and
+  fetch_comments_only in the stage graph) keep each other's.
+- Entries are keyed on the URL without its volatile query parameters (the
+  `since` watermark), so each sync replaces the page's entry instead of adding
+  one that is never asked for again.
+
+The URLs are parameters, so the fetcher can be pointed at a local server.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, parse_qsl, quote, urlencode, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from prasegist.comments.get_comments import headers as COMMENTS_HEADERS
+from prasegist.shared.paths import COMMENTS_FILEPATH, COMMENTS_URL, GIST_FILEPATH, GIST_URL
+
+CACHE_FILE = Path(__file__).parent / "fetch_cache.json"
+CONCURRENCY = 8
+PER_PAGE = 100
+MAX_PAGES = 100  # Failsafe to avoid infinite loop
+MAX_RETRIES = 3
+TIMEOUT = 10
+CACHE_LOCK = threading.Lock()
+# query parameters that change from one request to the next
+VOLATILE_PARAMS = {"since"}
+
+
+def cache_key(url: str) -> str:
+    """The url without VOLATILE_PARAMS."""
+    parts = urlparse(url)
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in VOLATILE_PARAMS
+    ]
+    return parts._replace(query=urlencode(query)).geturl()
+
+
+class Fetcher:
+    def __init__(self, concurrency: int = CONCURRENCY, cache_path: Path = CACHE_FILE):
+        self.concurrency = concurrency
+        self.cache_path = cache_path
+        self.cache: dict[str, dict] = self.load_cache()
+        self.updated: set[str] = set()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+        # wall-clock time before which no new request is sent
+        self.resume_at = 0.0
+
+    #########
+    # CACHE #
+    #########
+    def load_cache(self) -> dict[str, dict]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, IOError, json.JSONDecodeError):
+            return {}
+
+    def save_cache(self) -> None:
+        try:
+            with CACHE_LOCK:
+                # drop entries saved under a volatile URL before keys were
+                # normalised
+                cache = {
+                    url: entry
+                    for url, entry in self.load_cache().items()
+                    if cache_key(url) == url
+                }
+                cache.update((url, self.cache[url]) for url in self.updated)
+                with open(self.cache_path, "w", encoding="utf-8") as f:
+                    json.dump(cache, f)
+        except (OSError, IOError) as file_err:
+            print(f"Error writing to {self.cache_path}: {file_err}")
+
+    ##############
+    # RATE LIMIT #
+    ##############
+    async def wait_for_rate_limit(self) -> None:
+        delay = self.resume_at - time.time()
+        if delay > 0:
+            print(f"Rate limited, waiting {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+    def update_rate_limit(self, resp: requests.Response) -> bool:
+        """
+        Record when requests may resume.
+        Returns:
+            bool: The response was rejected by the rate limit.
+        """
+        retry_after = resp.headers.get("Retry-After")
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset = resp.headers.get("X-RateLimit-Reset")
+
+        if retry_after is not None and retry_after.isdigit():
+            self.resume_at = max(self.resume_at, time.time() + int(retry_after))
+        elif remaining == "0" and reset is not None and reset.isdigit():
+            self.resume_at = max(self.resume_at, float(reset))
+        else:
+            return False
+        return resp.status_code in (403, 429)
+
+    ###########
+    # REQUEST #
+    ###########
+    async def get(self, url: str, headers: dict | None = None) -> requests.Response:
+        """
+        Conditional GET of url. A 304 is turned back into the cached body, so
+        callers always see resp.text.
+        """
+        key = cache_key(url)
+        cached = self.cache.get(key)
+        request_headers = dict(headers or {})
+        if cached and cached.get("etag"):
+            request_headers["If-None-Match"] = cached["etag"]
+
+        async with self.semaphore:
+            for _ in range(MAX_RETRIES):
+                await self.wait_for_rate_limit()
+                resp = await asyncio.to_thread(
+                    self.session.get, url, headers=request_headers, timeout=TIMEOUT
+                )
+                if not self.update_rate_limit(resp):
+                    break
+
+        if resp.status_code == 304 and cached:
+            resp._content = cached["body"].encode("utf-8")
+            resp.encoding = "utf-8"
+            return resp
+
+        resp.raise_for_status()
+        # a 304 only ever matches the ETag sent, so one entry per key is enough
+        self.cache[key] = {
+            "etag": resp.headers.get("ETag"),
+            "body": resp.text,
+            "links": {k: v["url"] for k, v in resp.links.items()},
+        }
+        self.updated.add(key)
+        return resp
+
+    async def fetch_gist(self, url: str = GIST_URL) -> str | None:
+        try:
+            return (await self.get(url)).text
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching gist: {e}")
+            return None
+
+    async def fetch_comments(
+        self, url: str = COMMENTS_URL, since: str | None = None
+    ) -> list[dict] | None:
+        """
+        Fetch page 1, read the last page number from its Link header and fetch
+        the rest concurrently. Without a Link header, pages are fetched in
+        batches of `concurrency` until one comes back short.
+        `since` (an ISO 8601 timestamp) is passed through to the API, which
+        may ignore it and return every comment.
+        """
+        query = f"&since={quote(since)}" if since else ""
+
+        def page_url(page: int) -> str:
+            return f"{url}?per_page={PER_PAGE}&page={page}{query}"
+
+        async def fetch_page(page: int) -> list[dict]:
+            return (await self.get(page_url(page), COMMENTS_HEADERS)).json()
+
+        try:
+            first = await fetch_page(1)
+            all_comments = list(first)
+            last_url = self.cache.get(cache_key(page_url(1)), {}).get("links", {}).get("last")
+            if last_url:
+                last = int(parse_qs(urlparse(last_url).query)["page"][0])
+                pages = await asyncio.gather(
+                    *(fetch_page(p) for p in range(2, min(last, MAX_PAGES) + 1))
+                )
+                for comments in pages:
+                    all_comments.extend(comments)
+                return all_comments
+
+            page, short = 2, len(first) < PER_PAGE
+            while not short and page <= MAX_PAGES:
+                batch = range(page, min(page + self.concurrency, MAX_PAGES + 1))
+                for comments in await asyncio.gather(*(fetch_page(p) for p in batch)):
+                    all_comments.extend(comments)
+                    short = short or len(comments) < PER_PAGE
+                page += len(batch)
+            return all_comments
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching comments: {e}")
+            return None
+
+    def close(self) -> None:
+        self.session.close()
+        if self.updated:
+            self.save_cache()
+
+
+async def fetch_all(
+    gist_url: str = GIST_URL,
+    comments_url: str = COMMENTS_URL,
+    concurrency: int = CONCURRENCY,
+    cache_path: Path = CACHE_FILE,
+) -> tuple[str | None, list[dict] | None]:
+    """
+    Fetch the raw gist alongside every comment page.
+    Returns:
+        tuple: The gist text and the comments, None for whichever failed.
+    """
+    fetcher = Fetcher(concurrency, cache_path)
+    try:
+        return await asyncio.gather(
+            fetcher.fetch_gist(gist_url), fetcher.fetch_comments(comments_url)
+        )
+    finally:
+        fetcher.close()
+
+
+def fetch(
+    gist_url: str = GIST_URL,
+    comments_url: str = COMMENTS_URL,
+    concurrency: int = CONCURRENCY,
+    gist_path: Path = GIST_FILEPATH,
+    comments_path: Path = COMMENTS_FILEPATH,
+) -> tuple[str | None, list[dict] | None]:
+    """
+    Fetch the gist and comments and write them to gist.md / comments.json,
+    the same files get_gist and get_comments produce.
+    """
+    gist_text, comments = asyncio.run(fetch_all(gist_url, comments_url, concurrency))
+    save_fetched(gist_text, comments, gist_path, comments_path)
+    return gist_text, comments
+
+
+def fetch_gist_only(url: str = GIST_URL, path: Path = GIST_FILEPATH) -> str | None:
+    """Fetch the gist and write it to gist.md."""
+
+    async def run():
+        fetcher = Fetcher()
+        try:
+            return await fetcher.fetch_gist(url)
+        finally:
+            fetcher.close()
+
+    gist_text = asyncio.run(run())
+    save_fetched(gist_text, None, gist_path=path)
+    return gist_text
+
+
+def fetch_comments_only(
+    url: str = COMMENTS_URL, concurrency: int = CONCURRENCY, path: Path = COMMENTS_FILEPATH
+) -> list[dict] | None:
+    """Fetch every comment page and write them to comments.json."""
+
+    async def run():
+        fetcher = Fetcher(concurrency)
+        try:
+            return await fetcher.fetch_comments(url)
+        finally:
+            fetcher.close()
+
+    comments = asyncio.run(run())
+    save_fetched(None, comments, comments_path=path)
+    return comments
+
+
+def save_fetched(
+    gist_text: str | None,
+    comments: list[dict] | None,
+    gist_path: Path = GIST_FILEPATH,
+    comments_path: Path = COMMENTS_FILEPATH,
+) -> None:
+    """Write whichever of the two was fetched; None is left alone."""
+    try:
+        if gist_text is not None:
+            with open(gist_path, "w", encoding="utf-8") as f:
+                f.write(gist_text)
+        if comments is not None:
+            with open(comments_path, "w") as f:
+                json.dump(comments, f, indent=4)
+    except (OSError, IOError) as file_err:
+        print(f"Error writing fetched data: {file_err}")
+
+
+if __name__ == "__main__":
+    fetch()
@@ -1,10 +1,9 @@
 import requests
-from pathlib import Path
 
-GIST_ID = "c7a6bfca57631a4c45e2c75b7b5f881e"
-URL = f"https://gist.githubusercontent.com/khansgithub/{GIST_ID}/raw"
-FILENAME = "gist.md"
-FILEPATH = Path(__file__).parent / FILENAME
+from prasegist.shared.paths import GIST_FILEPATH as FILEPATH
+from prasegist.shared.paths import GIST_URL as URL
+
+FILENAME = FILEPATH.name
 headers = {}
 
 def get_gist():
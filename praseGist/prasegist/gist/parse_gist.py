@@ -1,24 +1,38 @@
 # ruff: noqa
 
 
+import hashlib
 import json
-from prasegist.gist.get_gist import FILEPATH
-from prasegist.shared.shared import BlockEnum, CodeBlock, Section, Section1, SomeSection, TextBlock, block_hash, hashStr
+import os
+from typing import Iterable, Iterator
+from prasegist.shared.paths import GIST_FILEPATH as FILEPATH
+from prasegist.shared.paths import GIST_PROCESSED as FILEPATH_PROCESSED
+from prasegist.shared.shared import BlockEnum, block_hash, section_hash
+from prasegist.shared.shared import CodeRecord, SectionRecord, TextRecord, dump_section
+from prasegist.shared.lines import LineKind, Token, tokenize
+from prasegist.shared.columnar import save_sections
+from prasegist.shared.counters import hot
+from prasegist.shared.util import process_pool
 
 # FILEPATH = FILEPATH.parent / "test_gist.md"
-FILEPATH_PROCESSED = FILEPATH.with_suffix(".processed.json")
+
+# parse_gist defaults; WORKERS = None (PRASEGIST_GIST_WORKERS=0) uses every
+# core, 1 parses serially
+WORKERS: int | None = int(os.environ.get("PRASEGIST_GIST_WORKERS", "1")) or None
+CHUNKSIZE = 16  # top-level spans per task
 
 
 class Context:
     def __init__(self, line_gen=None):
         # data structures
-        self.stack: list[SomeSection] = []
-        self.tree: list[SomeSection] = []
+        self.stack: list[SectionRecord] = []
+        self.tree: list[SectionRecord] = []
 
         # state track
         self.is_codeblock: bool = False
 
         # convenience
+        self.current_token: Token | None = None
         self.current_line = None
         self.section = None
         self.codeblock = None
@@ -31,7 +45,7 @@ class Context:
     ###########
     # SECTION #
     ###########
-    def section_add(self, section: SomeSection):
+    def section_add(self, section: SectionRecord):
         if (len(self.tree)) == 0:
             # very first entry
             if section.level != 1:
@@ -62,9 +76,8 @@ class Context:
             raise Exception("Expect codeblock")
         codeblock.lines.append(line.rstrip().rstrip("\n"))
 
-    def start_codeblock(self, line: str):
-        lang = line.replace("`", "").strip()
-        codeblock = CodeBlock(lang=lang)
+    def start_codeblock(self, lang: str):
+        codeblock = CodeRecord(lang)
         self.section.blocks.append(codeblock)
         
         self.is_codeblock = True
@@ -74,7 +87,7 @@ class Context:
         h = block_hash(self.codeblock)
         self.codeblock.hashes.append(h)
         self.stack[0].hashes.add(h)
-        self.stack[0].hashes.add(hashStr(self.section.name))
+        self.stack[0].hashes.add(section_hash(self.section.name))
         
         self.is_codeblock = False
         self.codeblock = None
@@ -83,11 +96,7 @@ class Context:
     # OTHER #
     #########
     def other_add(self, line: str):
-        if line == "\n":
-            return
-
-        textblock = TextBlock()
-        textblock.lines.append(line)
+        textblock = TextRecord([line])
         h = block_hash(textblock)
         self.section.blocks.append(textblock)
         self.textblock = textblock
@@ -101,59 +110,18 @@ class Context:
         if self.generator is None:
             return None
         try:
-            self.current_line = next(self.generator)
+            self.current_token = next(self.generator)
+            self.current_line = self.current_token.line
             self.iteration += 1
+            if hot.enabled:
+                hot["gist.lines"] += 1
             return self.current_line
         except StopIteration:
+            self.current_token = None
             self.current_line = None
             return None
 
 
-class parseFunctions:
-    def is_heading(line: str) -> bool:
-        """
-        1. Check if the line starts with a #.
-        2. Check the line has text after the #s
-        3. Make sure the heading is full of only #s (not something like #12#, only ##...)
-
-        Args:
-            line (str): line of text
-
-        Returns:
-            _bool_: line is a heading or not
-        """
-        return (
-            line.startswith("#")
-            and len((split_line := line.split(" "))) > 1
-            and split_line[0].replace("#", "") == ""
-        )
-
-    def heading_level(line: str) -> int:
-        i = 0
-        while (line[i]) == "#":
-            i += 1
-        return i
-
-    def extract_heading_details(line: str) -> tuple[int, str]:
-        """
-        Extracts the heading level (number of '#' at start) and the heading text.
-        Returns (heading_level, heading_text).
-        """
-        line = line.lstrip()
-        if not line.startswith("#"):
-            raise Exception("Unexpected error")
-        space_index = line.find(" ")
-        if space_index == -1:
-            # No heading text found
-            raise Exception("Unexpected error")
-        heading_level = space_index
-        heading_text = line[space_index + 1 :].strip()
-        return heading_level, heading_text
-
-    def is_codeblock(line: str) -> bool:
-        return line.startswith("```")
-
-
 def load_gist() -> list[str]:
     """
     Load the gist file.
@@ -169,45 +137,225 @@ def load_gist() -> list[str]:
         return []
 
 
-def save_gist(tree: list[SomeSection]) -> None:
+def iter_gist() -> Iterator[str]:
+    """
+    Lazily read the gist file one line at a time.
+    Yields:
+        str: The next gist text line.
+    """
+    try:
+        with open(FILEPATH, "r", encoding="utf-8") as f:
+            yield from f
+    except (OSError, IOError) as file_err:
+        print(f"Error reading from {FILEPATH}: {file_err}")
+
+
+def dump_gist(tree: list[SectionRecord], validate: bool = False) -> list[dict]:
+    """
+    The sections saved to FILEPATH_PROCESSED: the first section (the contents)
+    is dropped when there is more than one.
+    Returns:
+        list[dict]: JSON-ready section dicts.
+    """
+    return [dump_section(t, validate) for t in (tree[1:] if len(tree) > 1 else tree)]
+
+
+def save_gist(tree: list[SectionRecord], validate: bool = False) -> None:
     """
     Save gist to FILEPATH_PROCESSED.
+    With validate=True every section is checked against the pydantic models.
     Returns:
         None
     """
+    # json.dump(f, tree, indent=4)
+    save_sections(dump_gist(tree, validate), FILEPATH_PROCESSED)
 
-    def preprocess():
-        out = []
-        for t in tree[1:] if len(tree) > 1 else tree:
-            out.append(t.model_dump(mode="json", by_alias=True))
-        return out
 
-    try:
-        with open(FILEPATH_PROCESSED, "w") as f:
-            # json.dump(f, tree, indent=4)
-            json.dump(preprocess(), f, indent=4)
-    except (OSError, IOError) as file_err:
-        print(f"Error writing to {FILEPATH_PROCESSED}: {file_err}")
+def parse_gist(
+    gist_lines: list[str], workers: int | None = WORKERS, chunksize: int = CHUNKSIZE
+) -> list[SectionRecord]:
+    """
+    Parse the gist text lines. With more than one worker the top-level spans
+    (see split_sections) are parsed across a process pool; the output is the
+    same tree, in the same order.
+    Returns:
+        list[SectionRecord]: The parsed sections; see shared.to_model for the
+        pydantic form.
+    """
+    if workers is None or workers > 1:
+        return list(parse_gist_parallel(gist_lines, workers, chunksize))
 
+    context = Context(tokenize(gist_lines))
+    while context.next() is not None:
+        parse_section(context)
 
-def parse_gist(gist_lines: list[str]) -> list[SomeSection]:
+    return context.tree
+
+
+def parse_gist_stream(
+    gist_lines: Iterable[str], workers: int | None = WORKERS, chunksize: int = CHUNKSIZE
+) -> Iterator[SectionRecord]:
     """
-    Parse the gist text lines.
+    Parse the gist text lines, yielding each top-level section as soon as the
+    next heading 1 starts. Only the section being parsed is held in memory,
+    unless the parse runs across a process pool (see parse_gist).
+    Yields:
+        SectionRecord: The next completed top-level section.
+    """
+    if workers is None or workers > 1:
+        yield from parse_gist_parallel(gist_lines, workers, chunksize)
+        return
+
+    context = Context(tokenize(gist_lines))
+    while context.next() is not None:
+        parse_section(context)
+        if len(context.tree) > 1:
+            yield context.tree.pop(0)
+    yield from context.tree
+    context.tree.clear()
+
+
+#######################
+# INCREMENTAL REPARSE #
+#######################
+# A heading 1 outside a code fence empties the parser's stack, so each
+# top-level section parses the same on its own as in the whole document. Spans
+# are fingerprinted by their raw text and only new fingerprints are parsed, or
+# they are parsed in parallel and put back in document order.
+
+
+def split_sections(gist_lines: Iterable[str]) -> list[list[str]]:
+    """
+    Split the gist into top-level spans: one per heading 1 outside a code
+    fence, plus the lines before the first one (if any). Plain string checks
+    matching shared.lines.classify, so unchanged spans are never tokenized.
     Returns:
-        list[str]: The parsed gist text lines.
+        list[list[str]]: The lines of each span, in document order.
     """
+    spans: list[list[str]] = [[]]
+    is_codeblock = False
+    for line in gist_lines:
+        if line.startswith("# "):
+            if not is_codeblock:
+                spans.append([])
+        elif line.lstrip().startswith("```"):
+            is_codeblock = not is_codeblock
+        spans[-1].append(line)
+    return spans if spans[0] else spans[1:]
+
 
-    def line_generator():
-        for line in gist_lines:
-            yield line
+def span_fingerprint(span: list[str]) -> str:
+    return hashlib.blake2b("".join(span).encode(), digest_size=16).hexdigest()
 
-    context = Context(line_generator())
+
+def parse_span(span: list[str]) -> list[SectionRecord]:
+    """Parse one span on its own; the heading 1 section, if it has one."""
+    context = Context(tokenize(span))
     while context.next() is not None:
         parse_section(context)
-
     return context.tree
 
 
+class SectionCache:
+    """
+    Span fingerprint -> the span's parsed sections (one Section1 with its
+    hashes set, or none for the lines before the first heading). Holds the
+    spans of the last parse only.
+    """
+
+    def __init__(self):
+        self.sections: dict[str, list[SectionRecord]] = {}
+        self.parsed = 0
+        self.reused = 0
+
+
+def parse_gist_cached(gist_lines: Iterable[str], cache: SectionCache) -> list[SectionRecord]:
+    """
+    Same tree as parse_gist, reparsing only the top-level sections whose text
+    changed since the last call with this cache.
+    Returns:
+        list[SectionRecord]: The parsed sections, in document order.
+    """
+    sections: dict[str, list[SectionRecord]] = {}
+    tree: list[SectionRecord] = []
+    cache.parsed = cache.reused = 0
+    for span in split_sections(gist_lines):
+        key = span_fingerprint(span)
+        parsed = sections.get(key) or cache.sections.get(key)
+        if parsed is None:
+            parsed = parse_span(span)
+            cache.parsed += 1
+        else:
+            cache.reused += 1
+        sections[key] = parsed
+        tree.extend(parsed)
+    cache.sections = sections
+    return tree
+
+
+def parse_gist_parallel(
+    gist_lines: Iterable[str], workers: int | None = WORKERS, chunksize: int = CHUNKSIZE
+) -> Iterator[SectionRecord]:
+    """
+    Parse the top-level spans across a process pool, `chunksize` spans per
+    task. A gist with no more than `chunksize` spans is parsed serially.
+    Hot counters bumped in the workers are not collected.
+
+    A set comes back from a worker with the same members but possibly another
+    iteration order, which would change the "hashes" lists written out, so
+    each hashes set is rebuilt here in the order Context adds to it.
+    Yields:
+        SectionRecord: The parsed sections, in document order.
+    """
+    spans = split_sections(gist_lines)
+    if len(spans) <= chunksize:
+        for span in spans:
+            yield from parse_span(span)
+        return
+
+    with process_pool(workers) as pool:
+        for sections in pool.map(parse_span, spans, chunksize=chunksize):
+            for section in sections:
+                if section.hashes is not None:
+                    section.hashes = set()
+                    _add_hashes(section, section.hashes)
+                yield section
+
+
+def _add_hashes(section: SectionRecord, hashes: set[str]) -> None:
+    # Context.other_add / end_codeblock order: a section's blocks come before
+    # its children's; a code block left open at the end was never hashed
+    for block in section.blocks:
+        if block.hashes:
+            hashes.add(block.hashes[0])
+            if block.type == BlockEnum.CODE:
+                hashes.add(section_hash(section.name))
+    for child in section.children:
+        _add_hashes(child, hashes)
+
+
+def save_gist_stream(sections: Iterable[SectionRecord], validate: bool = False) -> None:
+    """
+    Save sections to FILEPATH_PROCESSED as they arrive. Matches save_gist: the
+    first section (the contents) is dropped when there is more than one.
+    Returns:
+        None
+    """
+
+    def preprocess():
+        first = None
+        for i, section in enumerate(sections):
+            if i == 0:
+                first = section
+                continue
+            first = None
+            yield dump_section(section, validate)
+        if first is not None:
+            yield dump_section(first, validate)
+
+    save_sections(preprocess(), FILEPATH_PROCESSED)
+
+
 def parse_section(context: Context):
     if context.is_codeblock:
         return handle_codeblock(context)
@@ -216,8 +364,7 @@ def parse_section(context: Context):
 
 
 def handle_codeblock(context: Context):
-    is_end = parseFunctions.is_codeblock(context.current_line)
-    if is_end:
+    if context.current_token.kind == LineKind.FENCE:
         context.end_codeblock()
         return
 
@@ -225,16 +372,16 @@ def handle_codeblock(context: Context):
 
 
 def handle_line(context: Context):
-    line = context.current_line
+    kind, heading_level, text, line = context.current_token
+
+    if kind == LineKind.FENCE:
+        context.start_codeblock(text)
+        return
 
-    codeblock = parseFunctions.is_codeblock(line)
-    if codeblock:
-        context.start_codeblock(line)
+    if kind == LineKind.BLANK:
         return
 
-    heading = parseFunctions.is_heading(line)
-    if heading:
-        heading_level, heading_text = parseFunctions.extract_heading_details(line)
+    if kind == LineKind.HEADING:
         current_level = len(context.stack)
 
         if heading_level > current_level:
@@ -247,12 +394,12 @@ def handle_line(context: Context):
             context.section_pop()
 
         context.section_add(
-            {1: Section1}.get(heading_level, Section)(
-                name=heading_text, level=heading_level
+            SectionRecord(
+                text, heading_level, hashes=set() if heading_level == 1 else None
             )
         )
     else:
-        context.other_add(context.current_line)
+        context.other_add(line)
     return
 
 
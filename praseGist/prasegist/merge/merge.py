@@ -5,25 +5,20 @@ Comments are added under their tag (section) with description as subsection key.
 Code blocks and misc content are converted to gist format.
 """
 
-import json
+import logging
 from dataclasses import dataclass
 from pathlib import Path
 
-from prasegist.comments.parse_comments import FILEPATH as COMMENTS_FILEPATH
-from prasegist.gist.parse_gist import FILEPATH as GIST_FILEPATH
-from prasegist.gist.parse_gist import (
-    CodeBlock,
-    Section,
-    Section1,
-    SomeSection,
-    TextBlock,
-)
-from prasegist.shared.shared import BlockEnum, block_hash
+from prasegist.shared.columnar import load_sections, save_sections
+from prasegist.shared.counters import counts, hot
+from prasegist.shared.dupes import SIMILARITY_THRESHOLD, NearDuplicateIndex
+from prasegist.shared.models import CodeBlock, Section1, TextBlock
+from prasegist.shared.paths import COMMENTS_PROCESSED, GIST_PROCESSED
+from prasegist.shared.paths import MERGED_GISTS as OUTPUT_FILE
+from prasegist.shared.shared import BlockEnum, block_hash, rehash_sections
 from prasegist.shared.util import find_duplicates_with_counts
 
-GIST_PROCESSED = GIST_FILEPATH.with_suffix(".processed.json")
-COMMENTS_PROCESSED = COMMENTS_FILEPATH.with_suffix(".processed.json")
-OUTPUT_FILE = Path(__file__).parent / "merged_gists.json"
+logger = logging.getLogger("app.merge")
 
 # Tag variations in comments -> canonical section name in gist
 TAG_TO_SECTION: dict[str, str] = {
@@ -63,156 +58,186 @@ def _normalize_tag(tag: str) -> str:
 
 
 def load_gist_processed(path: Path | None = None) -> dict:
-    """Load gist.processed.json."""
-    p = path or GIST_PROCESSED
-    with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Load gist.processed.json, migrating hashes from older schemes."""
+    data = load_sections(path or GIST_PROCESSED)
+    rehash_sections(data)
+    return data
 
 
 def load_comments_processed(path: Path | None = None) -> list[dict]:
-    """Load comments.processed.json."""
-    p = path or COMMENTS_PROCESSED
-    with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Load comments.processed.json, migrating hashes from older schemes."""
+    data = load_sections(path or COMMENTS_PROCESSED)
+    rehash_sections(data)
+    return data
 
 
 def save_gist_processed(data: dict) -> None:
     """Save gist.processed.json."""
-    out_file = OUTPUT_FILE
-    with open(out_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    save_sections(data, OUTPUT_FILE)
 
 
 @dataclass
 class GistMap:
-    section: SomeSection
-    parent: SomeSection | None
-
-
-def gist_map(gist: list[Section], parent: SomeSection = None) -> dict[str, GistMap]:
-    r = {}
-    for section in gist:
-        if hasattr(section, "children"):
-            pass
-            # r.update(gist_map(section['children'], section))
-        r[section["name"]] = DotDict(
-            {
-                "section": DotDict(section),
-                "parent": DotDict(parent) if parent else parent,
-            }
-        )
-    return r
-
-
-def covert_hash_list_to_set(sections: list[Section1], revert=False):
-    if revert:
-        for section in sections:
-            section.hashes = list(section.hashes)
+    section: dict
+    top_level: dict
+
+
+class MergeIndex:
+    """
+    Indexes built once per merge:
+      - owners:   block hash -> name of the top-level section holding it
+      - sections: section name -> the section and its top-level section,
+                  covering nested children (top-level names win on clashes)
+
+    so every incoming block is checked against its own hashes in O(1).
+
+    With fuzzy=True code blocks are also checked against a NearDuplicateIndex
+    of every code block already in the gist, rejecting near-duplicates as well
+    as exact block_hash matches.
+    """
+
+    def __init__(self, gists: list[dict], fuzzy: bool = False, threshold: float = SIMILARITY_THRESHOLD):
+        self.owners: dict[str, str] = {}
+        self.sections: dict[str, GistMap] = {}
+        self.fuzzy = NearDuplicateIndex(threshold) if fuzzy else None
+        for top_level in gists:
+            self.add_top_level(top_level)
+        for top_level in gists:
+            self.add_children([top_level], top_level)
+
+    def add_top_level(self, top_level: dict) -> None:
+        top_level["hashes"] = set(top_level.get("hashes", ()))
+        self.sections.setdefault(top_level["name"], GistMap(top_level, top_level))
+        for h in top_level["hashes"]:
+            self.owners.setdefault(h, top_level["name"])
+
+    def add_children(self, children: list[dict], top_level: dict) -> None:
+        stack = list(reversed(children))
+        while stack:
+            section = stack.pop()
+            if section is not top_level:
+                self.sections.setdefault(section["name"], GistMap(section, top_level))
+            if self.fuzzy is not None:
+                for block in section["blocks"]:
+                    self.add_fuzzy(block, top_level)
+            stack.extend(reversed(section.get("children", [])))
+
+    def add_fuzzy(self, block: dict, top_level: dict) -> None:
+        if sig := _code_signature(block):
+            self.fuzzy.add(sig, top_level["name"])
+
+    def is_duplicate(self, hashes: list[str], block: dict | None = None) -> bool:
+        if any(h in self.owners for h in hashes):
+            return True
+        if self.fuzzy is not None and block is not None:
+            return self.fuzzy.find(_code_signature(block)) is not None
+        return False
+
+    def claim(self, hashes: list[str], top_level: dict, block: dict | None = None) -> None:
+        for h in hashes:
+            self.owners.setdefault(h, top_level["name"])
+        top_level["hashes"].update(hashes)
+        if self.fuzzy is not None and block is not None:
+            self.add_fuzzy(block, top_level)
+
+
+def _code_signature(block: dict) -> str:
+    """Whitespace-normalised code, as check_dupes compares it."""
+    if block.get("type") != BlockEnum.CODE:
+        return ""
+    return " ".join("".join(block.get("lines") or []).split())
+
+
+def _snippet_hashes(snippet: dict) -> list[str]:
+    return snippet.get("hashes") or [block_hash(DotDict(snippet))]
+
+
+def _gist_block(snippet: dict) -> dict:
+    """Convert a comment block to gist format."""
+    if snippet["type"] == BlockEnum.CODE:
+        block = CodeBlock(lang=snippet["lang"], lines=snippet["lines"], hashes=snippet["hashes"])
     else:
-        for section in sections:
-            section.hashes = set(section.hashes)
+        block = TextBlock(lines=snippet["lines"], hashes=snippet["hashes"])
+    return block.model_dump(mode="json")
+
+
+def merge_with_section(comment: dict, section_map: GistMap, index: MergeIndex) -> int:
+    """
+    Append the comment's blocks to the section, skipping any block whose own
+    hashes are already present anywhere in the merged gist.
+    Returns:
+        int: Number of blocks dropped as duplicates.
+    """
+    if hot.enabled:
+        hot["merge.comments"] += 1
+        hot["merge.blocks_checked"] += len(comment["blocks"])
+    dropped = 0
+    for snippet in comment["blocks"]:
+        hashes = _snippet_hashes(snippet)
+        if index.is_duplicate(hashes, snippet):
+            dropped += 1
+            continue
+        snippet["hashes"] = hashes
+        section_map.section["blocks"].append(_gist_block(snippet))
+        index.claim(hashes, section_map.top_level, snippet)
+    return dropped
+
 
-def collect_all_hashes(sections: list[Section1]) -> set:
+def new_section(comment: dict, name: str, index: MergeIndex) -> dict:
     """
-    Collect all hashes from all sections (recursively including children)
-    and return as one large set.
+    Top-level section for a comment whose tag matches no section. The comment,
+    minus duplicate blocks, becomes its only child.
     """
-    all_hashes = set()
-    def _collect(sections):
-        for section in sections:
-            all_hashes.update(section.hashes)
-    _collect(sections)
-    return all_hashes
-
-def merge_with_section(
-    comment: Section1, section_map: GistMap, lookup: dict[str, GistMap]
-):
-    global all_hashes
-    # comment_name = _normalize_tag(comment.name)
-    section = section_map.section
-    for snippet in comment.blocks:
-        top_level_section = section_map
-        snippet: CodeBlock | TextBlock = DotDict(snippet)
-        is_code = snippet.type == BlockEnum.CODE
-
-        while top_level_section.section.level > 1:
-            top_level_section = lookup[top_level_section.parent.name]
-
-        hash_present = any([h in top_level_section.section.hashes or h in all_hashes for h in section.hashes])
-        if hash_present:
+    section = Section1(name=name, level=1, blocks=[], children=[], hashes=set()).model_dump()
+    blocks = []
+    for snippet in comment["blocks"]:
+        hashes = _snippet_hashes(snippet)
+        if index.is_duplicate(hashes, snippet):
             continue
+        index.claim(hashes, section, snippet)
+        blocks.append(snippet)
+    section["children"].append({**comment, "blocks": blocks})
+    index.sections[name] = GistMap(section, section)
+    return section
 
-        # if snippet.hash in top_level_section.section.hashes:
-        #     continue
-        
-        # if snippet.hash in all_hashes:
-        #     continue
-
-        snippet_block = (
-            CodeBlock(lang=snippet.lang, lines=snippet.lines, hashes=snippet.hashes)
-            if is_code
-            else TextBlock(lines=snippet.lines, hashes=snippet.hashes)
-        )
-        section.blocks.append(snippet_block.model_dump(mode="json"))
-        top_level_section.section.hashes.update(snippet.hashes)
-        all_hashes.update(snippet.hashes)
-
-
-def merge2() -> dict:
-    global all_hashes
-    gists: list[SomeSection] = [DotDict(d) for d in load_gist_processed()]
-    comments: list[Section] = [DotDict(d) for d in load_comments_processed()]
-
-    covert_hash_list_to_set(gists)
-    all_hashes = collect_all_hashes(gists)
-
-    # merged = merge_comments_into_gist(gist_data, comments)
-    ####################################################
-    gist_lookup: dict[str, GistMap] = gist_map(gists)
+
+def merge_sections(gists: list[dict], comments: list[dict], fuzzy: bool = False) -> list[dict]:
+    """
+    Merge comment sections into the gist sections, in place.
+    Returns:
+        list[dict]: The merged sections, with top-level hashes as sets.
+    """
+    index = MergeIndex(gists, fuzzy)
+    dropped = 0
     for comment in comments:
-        comment_name = _normalize_tag(comment.name)
-        section: GistMap | None = gist_lookup.get(comment_name, None)
-
-        # new section # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
-        if not section:
-
-            # Filter out all codeblocks and textblocks whose hash is present in all_hashes, in comment.
-            filtered_blocks = []
-            for snippet in comment.blocks:
-                snippet_hash = block_hash(DotDict(snippet))
-                if snippet_hash not in all_hashes:
-                    all_hashes.add(snippet_hash)
-                    filtered_blocks.append(snippet)
-            comment.blocks = filtered_blocks
-            # Build dict manually: comment is DotDict with comments schema, not gist
-
-            new_section = DotDict(
-                Section1(
-                    name=comment_name,
-                    level=1,
-                    blocks=[],
-                    children=[dict(comment)],
-                    hashes=set(),
-                ).model_dump()
-            )
-            gists.append(new_section)
-            gist_lookup[comment_name] = GistMap(
-                section=new_section,
-                parent=None,
-            )
+        comment_name = _normalize_tag(comment["name"])
+        section: GistMap | None = index.sections.get(comment_name, None)
+        if section is None:
+            gists.append(new_section(comment, comment_name, index))
+            dropped += len(comment["blocks"]) - len(gists[-1]["children"][0]["blocks"])
             continue
-        # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+        dropped += merge_with_section(comment, section, index)
+    counts["duplicates_dropped"] += dropped
+    logger.info(f"Merged {len(comments)} comments, dropped {dropped} duplicate blocks")
+    return gists
 
-        merge_with_section(comment, section, gist_lookup)
 
-    covert_hash_list_to_set(gists, revert=True)
+def merge2(fuzzy: bool = False) -> list[dict]:
+    """
+    Merge comments into the gist and save merged_gists.json. With fuzzy=True
+    comment code blocks that are near-duplicates (see shared.dupes) of code
+    already merged are dropped too.
+    """
+    gists = merge_sections(load_gist_processed(), load_comments_processed(), fuzzy)
+    for gist in gists:
+        gist["hashes"] = list(gist["hashes"])
     save_gist_processed(gists)
 
-    all_hashes2 = []
+    all_hashes = []
     for gist in gists:
-        all_hashes2.extend(gist.hashes)
-    x = find_duplicates_with_counts(all_hashes2)
-    print(x)
+        all_hashes.extend(gist["hashes"])
+    x = find_duplicates_with_counts(all_hashes)
+    logger.info(f"Hashes shared by top-level sections: {x}")
     return gists
 
 
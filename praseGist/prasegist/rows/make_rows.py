@@ -1,70 +1,74 @@
-import json
-from pathlib import Path
+from typing import Iterable, Iterator
 
-from pydantic import BaseModel, Field
+from prasegist.shared.columnar import load_rows, load_sections, save_rows
+from prasegist.shared.paths import MERGED_GISTS
+from prasegist.shared.paths import ROWS_JSON as OUTPUT_FILE
 
-from prasegist.merge.merge import OUTPUT_FILE as MERGED_GISTS
-from prasegist.merge.merge import DotDict
-from prasegist.shared.shared import CodeBlock, Section, SomeSection, TextBlock
 
+def load_merged_gists() -> list:
+    return load_sections(MERGED_GISTS)
 
-OUTPUT_FILE = Path(__file__).parent / "rows.json"
 
+def iter_rows(snippets: list[dict], path: list[str] = []) -> Iterator[dict]:
+    """
+    Yield one plain row dict (the shape of Row.model_dump()) per section, in
+    document order. Walks the merged tree with an explicit stack, so only the
+    pending siblings along the current path are held.
+    """
+    stack = [(snippet, path) for snippet in reversed(snippets)]
+    while stack:
+        snippet, tags = stack.pop()
+
+        if not (len(snippet["blocks"]) == 0 and snippet["level"] == 1):
+            yield {
+                "title": snippet["name"],
+                "tags": [snippet["name"]] if len(tags) < 1 else tags,
+                "description": "",
+                "blocks": snippet["blocks"],
+            }
+        children = snippet.get("children", [])
+        if children:
+            child_tags = [*tags, snippet["name"]]
+            stack.extend((child, child_tags) for child in reversed(children))
 
-class Row(BaseModel):
-    title: str = Field()
-    tags: list[str] = Field()
-    description: str = Field()
-    blocks: list[TextBlock | CodeBlock] = Field()
 
+def validate_rows(rows: Iterable[dict]) -> Iterator[dict]:
+    """Pass rows through unchanged, raising if one does not conform to Row."""
+    from prasegist.shared.models import Row
 
-def load_merged_gists() -> list:
-    with open(MERGED_GISTS, "r", encoding="utf-8") as f:
-        return json.load(f)
+    for row in rows:
+        Row.model_validate(row)
+        yield row
 
 
-def build_rows(snippets: list[SomeSection], path=[]) -> list:
-    rows = []
-    for snippet in snippets:
-        snippet: SomeSection = DotDict(snippet)
-
-        if not (len(snippet.blocks) == 0 and snippet.level == 1):
-            rows.append(
-                Row(
-                    title=snippet.name,
-                    tags=[snippet.name] if len(path) < 1 else path,
-                    description="",
-                    blocks=snippet.blocks,
-                ).model_dump()
-            )
-        children = snippet.get("children", [])
-        rows.extend(build_rows(children, [*path, snippet.name]))
-    return rows
+def build_rows(snippets: list[dict], path=[]) -> list:
+    return list(iter_rows(snippets, path))
 
 
-def make_rows():
+def make_rows(validate: bool = False):
     snippets = load_merged_gists()
-    rows = build_rows(snippets)
+    rows = iter_rows(snippets)
+    if validate:
+        rows = validate_rows(rows)
     # Save rows to file
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(rows, f, indent=2)
-        # filtered_rows = [row for row in rows if row["tags"]]
-        # filtered_out_rows = [row for row in rows if not row["tags"]]
-        # json.dump(filtered_rows, f, indent=2)
-        # if filtered_out_rows:
-        #     print("Rows filtered out (no tags):")
-        #     import pprint
-        #     pprint.pprint(filtered_out_rows)
+    save_rows(rows, OUTPUT_FILE)
+    # filtered_rows = [row for row in rows if row["tags"]]
+    # filtered_out_rows = [row for row in rows if not row["tags"]]
+    # json.dump(filtered_rows, f, indent=2)
+    # if filtered_out_rows:
+    #     print("Rows filtered out (no tags):")
+    #     import pprint
+    #     pprint.pprint(filtered_out_rows)
 
 
 def validate_file():
     """
     Loads and parses the generated file to ensure all rows conform to the Row type.
     """
-    with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    from prasegist.shared.models import Row
+
     rows = []
-    for entry in data:
+    for entry in load_rows(OUTPUT_FILE):
         row = Row(**entry)
         rows.append(row)
     return rows
@@ -1,20 +1,35 @@
 #!/usr/bin/env python3
 """
 Export rows.json to CSV files:
-  - snippets.csv: title, tags, description
+  - snippets.csv: title, tags, description, data_flat
     (tags = JSON array string, e.g. ["android","bash"])
-  - blocks.csv: type, lang, lines, pos, snippet_idx
+  - blocks.csv: type, lang, lines, pos, snippet_idx, lines_flat
     (lines = JSON array of strings; pos = 1-based block index; snippet_idx = 1-based snippet index)
+  data_flat / lines_flat are the normalized search text (search.data_flat /
+  search.lines_flat) the database's search indexes are built on.
   String arrays (tags, lines) are serialized with json.dumps so newlines, commas,
   quotes, and backslashes inside strings are escaped and round-trip correctly.
+
+export_rows skips the rows.json round trip: rows from make_rows.iter_rows stream
+straight into both CSV writers and the search index (search/index_file.py),
+with rows.json as an optional side output.
 """
 import json
 import csv
+import logging
+from collections import deque
 from pathlib import Path
+from typing import Iterable, Iterator
+
+from prasegist.rows.make_rows import iter_rows, load_merged_gists
+from prasegist.search.index_file import INDEX_FILE, write_index
+from prasegist.search.search import data_flat, lines_flat
+from prasegist.shared.columnar import load_rows, save_rows
+from prasegist.shared.counters import counts
+from prasegist.shared.paths import BLOCKS_CSV, ROWS_JSON, SNIPPETS_CSV
+from prasegist.shared.util import replacing
 
-ROWS_JSON = Path(__file__).resolve().parent / "rows.json"
-SNIPPETS_CSV = Path(__file__).resolve().parent / "snippets.csv"
-BLOCKS_CSV = Path(__file__).resolve().parent / "blocks.csv"
+logger = logging.getLogger("app.rows")
 
 
 def _str(val):
@@ -24,28 +39,36 @@ def _str(val):
     return str(val) if not isinstance(val, str) else val
 
 
-def build_csv():
-    with open(ROWS_JSON, encoding="utf-8") as f:
-        rows = json.load(f)
-
-    # Snippets CSV: title, tags (JSON array), description
-    with open(SNIPPETS_CSV, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-        w.writerow(["title", "tags", "description"])
-        for snippet in rows:
+def write_csv(rows: Iterable[dict]) -> Iterator[dict]:
+    """
+    Write snippets.csv and blocks.csv in a single pass over rows, yielding
+    each row once its CSV lines are written. Both files are replaced when the
+    generator is exhausted; until then the previous files stay in place.
+    """
+    with (
+        replacing(SNIPPETS_CSV) as snippets_tmp,
+        replacing(BLOCKS_CSV) as blocks_tmp,
+        open(snippets_tmp, "w", newline="", encoding="utf-8") as sf,
+        open(blocks_tmp, "w", newline="", encoding="utf-8") as bf,
+    ):
+        # Snippets CSV: title, tags (JSON array), description, data_flat
+        sw = csv.writer(sf, quoting=csv.QUOTE_MINIMAL)
+        sw.writerow(["title", "tags", "description", "data_flat"])
+        # Blocks CSV: type, lang, lines (JSON array), pos, snippet_idx, lines_flat
+        bw = csv.writer(bf, quoting=csv.QUOTE_MINIMAL)
+        bw.writerow(["type", "lang", "lines", "pos", "snippet_idx", "lines_flat"])
+
+        row_count = block_count = 0
+        for snippet_idx, snippet in enumerate(rows, start=1):
             tags = snippet.get("tags") or []
             tags_str = json.dumps(tags, ensure_ascii=False) if tags else "[]"
-            w.writerow([
+            sw.writerow([
                 _str(snippet.get("title")),
                 tags_str,
                 _str(snippet.get("description")),
+                data_flat(snippet),
             ])
 
-    # Blocks CSV: type, lang, lines (JSON array), pos, snippet_idx
-    with open(BLOCKS_CSV, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-        w.writerow(["type", "lang", "lines", "pos", "snippet_idx"])
-        for snippet_idx, snippet in enumerate(rows, start=1):
             for pos, block in enumerate(snippet.get("blocks") or [], start=1):
                 lines = block.get("lines")
                 if isinstance(lines, list):
@@ -54,17 +77,48 @@ def build_csv():
                     lines_str = json.dumps(lines, ensure_ascii=False)
                 else:
                     lines_str = json.dumps([_str(lines)] if lines else [])
-                w.writerow([
+                bw.writerow([
                     _str(block.get("type")),
                     _str(block.get("lang")),
                     lines_str,
                     pos,
                     snippet_idx,
+                    lines_flat(block),
                 ])
+                block_count += 1
+            row_count += 1
+            yield snippet
+
+    counts["rows"] += row_count
+    counts["blocks"] += block_count
+    logger.info(f"Wrote {SNIPPETS_CSV} ({row_count} rows)")
+    logger.info(f"Wrote {BLOCKS_CSV} ({block_count} blocks)")
+
+
+def build_csv():
+    deque(write_csv(load_rows(ROWS_JSON)), maxlen=0)
+
+
+def export_rows(rows_json: Path | None = ROWS_JSON, index: Path | None = INDEX_FILE):
+    """
+    Build rows from merged_gists.json and stream them into both CSV files,
+    and into rows_json and the search index unless they are None.
+    """
+    publish_rows(iter_rows(load_merged_gists()), rows_json, index)
+
 
-    print(f"Wrote {SNIPPETS_CSV}")
-    print(f"Wrote {BLOCKS_CSV}")
+def publish_rows(
+    rows: Iterable[dict], rows_json: Path | None = ROWS_JSON, index: Path | None = INDEX_FILE
+):
+    """Stream rows into both CSV files, rows_json and the search index."""
+    rows = write_csv(rows)
+    if index is not None:
+        rows = write_index(rows, index)
+    if rows_json is None:
+        deque(rows, maxlen=0)
+        return
+    save_rows(rows, rows_json)
 
 
 if __name__ == "__main__":
-    build_csv()
+    export_rows()
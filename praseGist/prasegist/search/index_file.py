@@ -0,0 +1,283 @@
+"""
+Binary search index written by the rows stage, so a process can query the
+rows without loading rows.json and rebuilding SearchIndex.
+
+The file is mmap'ed and read in place; a query only touches the header, the
+term dictionary pages bisect walks through, the postings of its terms and the
+records of the documents it returns.
+
+It is a shared.columnar segment file (MAGIC, JSON directory with the BM25
+stats, aligned segments) holding, for each table (snippets, blocks):
+
+    <table>.terms         utf-8 terms, sorted bytewise, concatenated
+    <table>.term_offsets  Q[n + 1] into .terms
+    <table>.post_offsets  Q[n + 1] into .postings
+    <table>.df            I[n] documents per term
+    <table>.postings      varints per term: (doc id delta, term frequency)*
+    <table>.lengths       I[docs] words per document, for BM25
+  and the packed text segment:
+    snippets.records      JSON [title, tags, description, first block, blocks]
+    blocks.records        JSON [snippet, pos, type, lang, lines]
+    *.record_offsets      Q[docs + 1] into the records
+
+Only the word (BM25) queries are served from the file; trigram queries still
+need SearchIndex.
+"""
+
+import json
+import logging
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from prasegist.search.search import (
+    QueryResult,
+    TextIndex,
+    bm25,
+    data_flat,
+    lines_flat,
+    words,
+)
+from prasegist.shared.columnar import MappedSegments, write_segments
+from prasegist.shared.paths import INDEX_FILE
+
+MAGIC = b"PGSIDX01"
+TABLES = ("snippets", "blocks")
+
+logger = logging.getLogger("app.search")
+
+
+def encode_varint(n: int, out: bytearray) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def decode_varints(buf: memoryview) -> Iterator[int]:
+    n = shift = 0
+    for byte in buf:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield n
+            n = shift = 0
+
+
+class IndexWriter:
+    def __init__(self):
+        self.text = {table: TextIndex() for table in TABLES}
+        self.records = {table: bytearray() for table in TABLES}
+        self.record_offsets = {table: array("Q", [0]) for table in TABLES}
+
+    def _record(self, table: str, record: list) -> None:
+        self.records[table] += json.dumps(record, ensure_ascii=False).encode()
+        self.record_offsets[table].append(len(self.records[table]))
+
+    def add(self, row: dict) -> None:
+        snippet = self.text["snippets"].add(data_flat(row))
+        first_block = len(self.text["blocks"].lengths)
+        for pos, block in enumerate(row["blocks"], start=1):
+            self.text["blocks"].add(lines_flat(block))
+            self._record(
+                "blocks",
+                [snippet, pos, block["type"], block.get("lang"), block["lines"]],
+            )
+        self._record(
+            "snippets",
+            [row["title"], row["tags"], row["description"], first_block, len(row["blocks"])],
+        )
+
+    def segments(self) -> Iterator[tuple[str, bytes | array]]:
+        for table in TABLES:
+            index = self.text[table]
+            terms = sorted((term.encode(), term) for term in index.postings)
+
+            blob = bytearray()
+            term_offsets = array("Q", [0])
+            postings = bytearray()
+            post_offsets = array("Q", [0])
+            df = array("I")
+            for encoded, term in terms:
+                blob += encoded
+                term_offsets.append(len(blob))
+                prev = 0
+                for doc_id, tf in sorted(index.postings[term].items()):
+                    encode_varint(doc_id - prev, postings)
+                    encode_varint(tf, postings)
+                    prev = doc_id
+                post_offsets.append(len(postings))
+                df.append(len(index.postings[term]))
+
+            yield f"{table}.terms", blob
+            yield f"{table}.term_offsets", term_offsets
+            yield f"{table}.post_offsets", post_offsets
+            yield f"{table}.df", df
+            yield f"{table}.postings", postings
+            yield f"{table}.lengths", array("I", index.lengths)
+            yield f"{table}.records", self.records[table]
+            yield f"{table}.record_offsets", self.record_offsets[table]
+
+    def write(self, path: Path = INDEX_FILE) -> None:
+        stats = {
+            table: {
+                "docs": len(self.text[table].lengths),
+                "avg_length": self.text[table].avg_length,
+            }
+            for table in TABLES
+        }
+        try:
+            write_segments(path, MAGIC, list(self.segments()), {"stats": stats})
+        except (OSError, IOError) as file_err:
+            print(f"Error writing to {path}: {file_err}")
+
+
+def write_index(rows: Iterable[dict], path: Path = INDEX_FILE) -> Iterator[dict]:
+    """
+    Pass rows through, writing the index at path once they are exhausted.
+    """
+    writer = IndexWriter()
+    for row in rows:
+        writer.add(row)
+        yield row
+    writer.write(path)
+    logger.info(f"Wrote {path}")
+
+
+class _Terms:
+    """The sorted term dictionary as a sequence of bytes, for bisect."""
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.blob[self.offsets[i] : self.offsets[i + 1]])
+
+
+class MappedTable:
+    def __init__(self, segments: dict[str, memoryview], table: str, stats: dict):
+        self.terms = _Terms(segments[f"{table}.terms"], segments[f"{table}.term_offsets"])
+        self.post_offsets = segments[f"{table}.post_offsets"]
+        self.df = segments[f"{table}.df"]
+        self.postings_blob = segments[f"{table}.postings"]
+        self.lengths = segments[f"{table}.lengths"]
+        self.records = segments[f"{table}.records"]
+        self.record_offsets = segments[f"{table}.record_offsets"]
+        self.docs = stats["docs"]
+        self.avg_length = stats["avg_length"]
+
+    def postings(self, term: str) -> dict[int, int] | None:
+        key = term.encode()
+        i = bisect_left(self.terms, key)
+        if i == len(self.terms) or self.terms[i] != key:
+            return None
+        values = decode_varints(
+            self.postings_blob[self.post_offsets[i] : self.post_offsets[i + 1]]
+        )
+        out = {}
+        doc_id = 0
+        for delta, tf in zip(values, values):
+            doc_id += delta
+            out[doc_id] = tf
+        return out
+
+    def search(self, q: str) -> list[tuple[float, int]]:
+        """Same matching and ranking as TextIndex.search."""
+        terms = set(words(q))
+        if not terms:
+            return []
+        postings = []
+        for term in terms:
+            posting = self.postings(term)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        matched = set(postings[0])
+        for posting in postings[1:]:
+            matched.intersection_update(posting)
+
+        scored = []
+        for doc_id in matched:
+            length = self.lengths[doc_id]
+            score = sum(
+                bm25(posting[doc_id], len(posting), self.docs, length, self.avg_length)
+                for posting in postings
+            )
+            scored.append((score, doc_id))
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return scored
+
+    def record(self, doc_id: int) -> list:
+        start, end = self.record_offsets[doc_id], self.record_offsets[doc_id + 1]
+        return json.loads(bytes(self.records[start:end]))
+
+
+class MappedIndex:
+    """
+    Read-only view of an index file. Use as a context manager, or call close()
+    when done.
+    """
+
+    def __init__(self, path: Path = INDEX_FILE):
+        self._mapped = MappedSegments(path, MAGIC)
+        stats = self._mapped.meta["stats"]
+        self.tables = {
+            table: MappedTable(self._mapped.segments, table, stats[table])
+            for table in TABLES
+        }
+
+    def close(self) -> None:
+        self.tables = {}
+        self._mapped.close()
+
+    def __enter__(self) -> "MappedIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    ###########
+    # RESULTS #
+    ###########
+    def _block_result(self, block_id: int, snippet: list | None = None) -> QueryResult:
+        snippet_id, pos, type_, lang, lines = self.tables["blocks"].record(block_id)
+        if snippet is None:
+            snippet = self.tables["snippets"].record(snippet_id)
+        title, tags, description, _, _ = snippet
+        return QueryResult(snippet_id + 1, title, tags, description, type_, lang, lines, pos)
+
+    def _snippet_results(self, snippet_id: int) -> list[QueryResult]:
+        snippet = self.tables["snippets"].record(snippet_id)
+        title, tags, description, first_block, count = snippet
+        if count == 0:
+            return [QueryResult(snippet_id + 1, title, tags, description, None, None, None, None)]
+        return [
+            self._block_result(block_id, snippet)
+            for block_id in range(first_block, first_block + count)
+        ]
+
+    ###########
+    # QUERIES #
+    ###########
+    def snippets_fts_query(self, q: str) -> list[QueryResult]:
+        out = []
+        for _, snippet_id in self.tables["snippets"].search(q):
+            out.extend(self._snippet_results(snippet_id))
+        return out
+
+    def blocks_fts_query(self, q: str) -> list[QueryResult]:
+        return [self._block_result(b) for _, b in self.tables["blocks"].search(q)]
+
+
+if __name__ == "__main__":
+    with MappedIndex() as index:
+        for result in index.snippets_fts_query(" ".join(sys.argv[1:])):
+            print(result.id, result.tags, result.title, result.pos)
@@ -0,0 +1,316 @@
+"""
+Embedded search over the rows built by make_rows, for querying pipeline output
+offline or in tests without a database.
+
+The query methods mirror the SQL functions in db/src/sql/supabase/functions.sql
+and return the same query_result shape (id, title, tags, description, type,
+lang, lines, pos), where id is the 1-based snippet_idx the loader maps to
+snippets.id:
+
+  snippets_fts_query / blocks_fts_query
+      every query word must match (plainto_tsquery); ranked by BM25
+  snippets_trgm_query / blocks_trgm_query
+      pg_trgm-style trigram similarity >= SIMILARITY_THRESHOLD or a
+      case-insensitive substring match; same ranking and limit as the SQL
+
+Blocks are searched through lines_flat and snippets (for full text) through
+data_flat, the normalized columns the pipeline writes for the database.
+  full_search
+      union of the four, one result per id, ordered by id descending
+
+Both indexes are inverted: words -> postings with term frequencies for BM25,
+and trigrams -> documents for fuzzy candidates, so a query only touches
+documents sharing a word or trigram with it.
+"""
+
+import math
+import re
+from collections import defaultdict
+from typing import Iterable, NamedTuple
+
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm.similarity_threshold default
+LIMIT = 20
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD = re.compile(r"\w+")
+_TRGM_WORD = re.compile(r"[^\W_]+")
+
+
+class QueryResult(NamedTuple):
+    id: int
+    title: str
+    tags: list[str]
+    description: str
+    type: str | None
+    lang: str | None
+    lines: list[str] | None
+    pos: int | None
+
+
+def words(text: str) -> list[str]:
+    """Lowercased words, roughly to_tsvector('simple', text)."""
+    return _WORD.findall(text.lower())
+
+
+def trigrams(text: str) -> set[str]:
+    """pg_trgm trigrams: per alphanumeric word, padded "  word "."""
+    out = set()
+    for word in _TRGM_WORD.findall(text.lower()):
+        padded = f"  {word} "
+        out.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return out
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+def char_trigrams(text: str) -> set[str]:
+    """Raw trigrams of the lowercased text, used to narrow substring matches."""
+    text = text.lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def flat(parts: Iterable[str | None]) -> str:
+    """array_to_string_immut: join with spaces, skipping NULLs."""
+    return " ".join(p for p in parts if p is not None)
+
+
+def snippet_flat(row: dict) -> str:
+    return flat([row["title"], row["description"], *row["tags"]])
+
+
+def block_flat(block: dict) -> str:
+    return flat([block.get("lang"), *block["lines"]])
+
+
+def normalize(text: str) -> str:
+    """Lowercased, whitespace runs collapsed to one space."""
+    return " ".join(text.lower().split())
+
+
+def data_flat(row: dict) -> str:
+    """snippets.data_flat, the column the snippet search indexes are built on."""
+    return normalize(snippet_flat(row))
+
+
+def lines_flat(block: dict) -> str:
+    """blocks.lines_flat, the column the block search indexes are built on."""
+    return normalize(block_flat(block))
+
+
+def bm25(tf: int, df: int, n: int, length: int, avg_length: float) -> float:
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_length or 1))
+    return idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+
+class TextIndex:
+    """Word postings with term frequencies, ranked with BM25."""
+
+    def __init__(self, docs: Iterable[str] = ()):
+        self.postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self.lengths: list[int] = []
+        self.total_length = 0  # sum(self.lengths), kept by add()
+        for text in docs:
+            self.add(text)
+
+    @property
+    def avg_length(self) -> float:
+        return (self.total_length / len(self.lengths)) if self.lengths else 0.0
+
+    def add(self, text: str) -> int:
+        doc_id = len(self.lengths)
+        tokens = words(text)
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        for token in tokens:
+            posting = self.postings[token]
+            posting[doc_id] = posting.get(doc_id, 0) + 1
+        return doc_id
+
+    def search(self, q: str) -> list[tuple[float, int]]:
+        """
+        Documents containing every query word, as (score, doc_id) best first.
+        """
+        terms = set(words(q))
+        if not terms:
+            return []
+        postings = [self.postings.get(t) for t in terms]
+        if not all(postings):
+            return []
+        postings.sort(key=len)
+        matched = set(postings[0])
+        for posting in postings[1:]:
+            matched.intersection_update(posting)
+
+        n = len(self.lengths)
+        avg_length = self.avg_length
+        scored = []
+        for doc_id in matched:
+            length = self.lengths[doc_id]
+            score = sum(
+                bm25(posting[doc_id], len(posting), n, length, avg_length)
+                for posting in postings
+            )
+            scored.append((score, doc_id))
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return scored
+
+
+class TrigramIndex:
+    """
+    Trigram postings for fuzzy matching. Each document has one or more fields;
+    a document is a candidate for q if any field shares a pg_trgm trigram
+    with q, or (for substring matches) contains every raw trigram of q.
+    """
+
+    def __init__(self, docs: list[list[str]]):
+        self.fields = [[(text, trigrams(text)) for text in doc] for doc in docs]
+        self.postings: dict[str, set[int]] = defaultdict(set)
+        self.char_postings: dict[str, set[int]] = defaultdict(set)
+        for doc_id, doc in enumerate(docs):
+            for text, grams in self.fields[doc_id]:
+                for gram in grams:
+                    self.postings[gram].add(doc_id)
+                for gram in char_trigrams(text):
+                    self.char_postings[gram].add(doc_id)
+
+    def candidates(self, q: str, q_grams: set[str]) -> set[int]:
+        out = set()
+        for gram in q_grams:
+            out.update(self.postings.get(gram, ()))
+
+        raw = char_trigrams(q)
+        if not raw:
+            # too short to narrow down, check every document
+            return set(range(len(self.fields)))
+        substring = None
+        for gram in raw:
+            posting = self.char_postings.get(gram, set())
+            substring = set(posting) if substring is None else substring & posting
+            if not substring:
+                break
+        return out | (substring or set())
+
+    def search(self, q: str, weights: list[float]) -> list[tuple[float, float, int]]:
+        """
+        Documents where any field is similar to q or contains it (ilike
+        '%q%'), as (weighted similarity, best distance, doc_id).
+        """
+        q_grams = trigrams(q)
+        needle = q.lower()
+        out = []
+        for doc_id in self.candidates(q, q_grams):
+            sims = [similarity(grams, q_grams) for _, grams in self.fields[doc_id]]
+            contains = any(needle in text.lower() for text, _ in self.fields[doc_id])
+            if not contains and max(sims) < SIMILARITY_THRESHOLD:
+                continue
+            weighted = sum(w * s for w, s in zip(weights, sims))
+            out.append((weighted, 1 - max(sims), doc_id))
+        return out
+
+
+class SearchIndex:
+    def __init__(self, rows: Iterable[dict]):
+        self.rows: list[dict] = list(rows)
+        # (snippet_idx 0-based, pos 1-based, block)
+        self.blocks: list[tuple[int, int, dict]] = [
+            (i, pos, block)
+            for i, row in enumerate(self.rows)
+            for pos, block in enumerate(row["blocks"], start=1)
+        ]
+
+        blocks_flat = [lines_flat(block) for _, _, block in self.blocks]
+
+        self.snippet_text = TextIndex(data_flat(row) for row in self.rows)
+        self.block_text = TextIndex(blocks_flat)
+        self.snippet_trgm = TrigramIndex(
+            [[row["title"], row["description"], flat(row["tags"])] for row in self.rows]
+        )
+        self.block_trgm = TrigramIndex([[text] for text in blocks_flat])
+
+    ###########
+    # RESULTS #
+    ###########
+    def _snippet_results(self, i: int) -> list[QueryResult]:
+        """One result per block of the snippet (left join blocks)."""
+        row = self.rows[i]
+        if not row["blocks"]:
+            return [QueryResult(i + 1, row["title"], row["tags"], row["description"], None, None, None, None)]
+        return [
+            self._block_result(i, pos, block)
+            for pos, block in enumerate(row["blocks"], start=1)
+        ]
+
+    def _block_result(self, i: int, pos: int, block: dict) -> QueryResult:
+        row = self.rows[i]
+        return QueryResult(
+            i + 1,
+            row["title"],
+            row["tags"],
+            row["description"],
+            block["type"],
+            block.get("lang"),
+            block["lines"],
+            pos,
+        )
+
+    ###########
+    # QUERIES #
+    ###########
+    def snippets_fts_query(self, q: str) -> list[QueryResult]:
+        out = []
+        for _, i in self.snippet_text.search(q):
+            out.extend(self._snippet_results(i))
+        return out
+
+    def blocks_fts_query(self, q: str) -> list[QueryResult]:
+        return [self._block_result(*self.blocks[b]) for _, b in self.block_text.search(q)]
+
+    def snippets_trgm_query(self, q: str) -> list[QueryResult]:
+        matched = self.snippet_trgm.search(q, weights=[2, 1, 1.5])
+        matched.sort(key=lambda m: (-m[0], m[1], m[2]))
+        out = []
+        for _, _, i in matched:
+            out.extend(self._snippet_results(i))
+            if len(out) >= LIMIT:
+                break
+        return out[:LIMIT]
+
+    def blocks_trgm_query(self, q: str) -> list[QueryResult]:
+        # lines_flat is normalized, so is the ilike needle
+        matched = self.block_trgm.search(normalize(q), weights=[1])
+        matched.sort(key=lambda m: (-m[0], m[1], m[2]))
+        return [self._block_result(*self.blocks[b]) for _, _, b in matched[:LIMIT]]
+
+    def full_search(self, q: str) -> list[QueryResult]:
+        combined: dict[int, QueryResult] = {}
+        for query in (
+            self.snippets_trgm_query,
+            self.snippets_fts_query,
+            self.blocks_fts_query,
+            self.blocks_trgm_query,
+        ):
+            for result in query(q):
+                combined.setdefault(result.id, result)
+        return [combined[i] for i in sorted(combined, reverse=True)]
+
+
+def load_index() -> SearchIndex:
+    """Search index over merged_gists.json."""
+    from prasegist.rows.make_rows import iter_rows, load_merged_gists
+
+    return SearchIndex(iter_rows(load_merged_gists()))
+
+
+if __name__ == "__main__":
+    import sys
+
+    index = load_index()
+    for result in index.full_search(" ".join(sys.argv[1:])):
+        print(result.id, result.tags, result.title)
@@ -0,0 +1,140 @@
+"""
+Artifacts passed between stages, and the segment container of the search
+index.
+
+save_sections / load_sections and save_rows / load_rows read and write the
+JSON artifacts (processed gist/comments, merged_gists, rows). Writes go to a
+file beside the artifact that is then moved over it, so a stage reading it,
+or the watcher, never sees a partial file.
+
+write_segments / MappedSegments are the binary container of search.idx
+(search/index_file.py): a small JSON directory followed by aligned segments,
+read in place through mmap.
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from prasegist.shared.util import replacing, write_json_array
+
+# JSON indent per artifact kind
+INDENT = {"sections": 4, "rows": 2}
+
+_HEADER = struct.Struct("<8sI")
+_ALIGN = 8
+
+
+############
+# SEGMENTS #
+############
+def write_segments(
+    path: Path, magic: bytes, segments: list[tuple[str, bytes | array]], meta: dict
+) -> None:
+    """
+    Write MAGIC, a uint32 directory size, the JSON directory (meta plus
+    "segments": {name: [offset, length, typecode]}) and the segments, each
+    8-byte aligned. The file is written aside and swapped in, so readers
+    holding a mapping of the old file are unaffected.
+    """
+    directory = {**meta, "byteorder": sys.byteorder, "segments": {}}
+    # offsets depend on the directory size, so lay out until it settles
+    header = b""
+    while len(header) != len(json.dumps(directory).encode()):
+        header = json.dumps(directory).encode()
+        offset = _HEADER.size + len(header)
+        for name, data in segments:
+            offset += -offset % _ALIGN
+            typecode = data.typecode if isinstance(data, array) else "B"
+            size = len(data) * (data.itemsize if isinstance(data, array) else 1)
+            directory["segments"][name] = [offset, size, typecode]
+            offset += size
+    header = json.dumps(directory).encode()
+
+    with replacing(path) as tmp, open(tmp, "wb") as f:
+        f.write(_HEADER.pack(magic, len(header)))
+        f.write(header)
+        for _, data in segments:
+            f.write(b"\0" * (-f.tell() % _ALIGN))
+            f.write(data)
+
+
+class MappedSegments:
+    """
+    Read-only mapping of a file written by write_segments. `segments` maps
+    each name to a memoryview cast to its typecode; `meta` is the directory.
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, path: Path, magic: bytes):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.segments: dict[str, memoryview] = {}
+        found, size = _HEADER.unpack_from(self._mmap)
+        if found != magic:
+            self.close()
+            raise ValueError(f"{path}: expected {magic!r}, found {found!r}")
+        self.meta = json.loads(self._mmap[_HEADER.size : _HEADER.size + size])
+        if self.meta["byteorder"] != sys.byteorder:
+            self.close()
+            raise ValueError(f"{path} was written on a {self.meta['byteorder']} endian host")
+
+        view = memoryview(self._mmap)
+        self.segments = {
+            name: view[offset : offset + length].cast(typecode)
+            for name, (offset, length, typecode) in self.meta["segments"].items()
+        }
+        view.release()
+
+    def close(self) -> None:
+        # every view into the mapping has to go before the mapping can
+        for segment in self.segments.values():
+            segment.release()
+        self.segments = {}
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "MappedSegments":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+#############
+# ARTIFACTS #
+#############
+def save_sections(
+    sections: Iterable[dict], path: Path, indent: int = INDENT["sections"]
+) -> None:
+    """Save section dicts to the JSON artifact `path`."""
+    try:
+        with replacing(path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+            write_json_array(f, sections, indent=indent)
+    except (OSError, IOError) as file_err:
+        print(f"Error writing to {path}: {file_err}")
+
+
+def load_sections(path: Path) -> list[dict]:
+    """Load the section dicts saved by save_sections."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_rows(rows: Iterable[dict], path: Path, indent: int = INDENT["rows"]) -> None:
+    """Save rows to the JSON artifact `path`."""
+    try:
+        with replacing(path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+            write_json_array(f, rows, indent=indent)
+    except (OSError, IOError) as file_err:
+        print(f"Error writing to {path}: {file_err}")
+
+
+def load_rows(path: Path) -> Iterator[dict]:
+    """Rows saved by save_rows."""
+    with open(path, "r", encoding="utf-8") as f:
+        return iter(json.load(f))
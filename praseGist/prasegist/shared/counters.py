@@ -0,0 +1,43 @@
+"""
+Counters read by the stage instrumentation in prasegist.shared.metrics.
+
+counts  always on. Stages add coarse totals (rows, duplicates dropped, ...)
+        once per call.
+hot     opt-in with PRASEGIST_COUNTERS=1. Bumped per line / block / comment on
+        hot paths, always behind `if hot.enabled:` so they cost one attribute
+        lookup when off.
+
+Both keep one Counter per thread, so stages the scheduler runs side by side
+(stage_cache.run_graph) are counted separately.
+"""
+
+import os
+import threading
+from collections import Counter
+
+
+class Counters:
+    def __init__(self):
+        self._local = threading.local()
+
+    def counter(self) -> Counter:
+        """This thread's counts."""
+        try:
+            return self._local.counter
+        except AttributeError:
+            self._local.counter = Counter()
+            return self._local.counter
+
+    def __getitem__(self, key: str) -> int:
+        return self.counter()[key]
+
+    def __setitem__(self, key: str, value: int) -> None:
+        self.counter()[key] = value
+
+
+class HotCounters(Counters):
+    enabled: bool = os.environ.get("PRASEGIST_COUNTERS") == "1"
+
+
+counts = Counters()
+hot = HotCounters()
@@ -0,0 +1,169 @@
+"""
+Near-duplicate detection for code signatures.
+
+Each signature is cut into character shingles and summarised by a MinHash
+sketch (one-permutation hashing: every shingle hash lands in one of NUM_PERM
+bins, each bin keeps its minimum). Sketches are split into bands; signatures
+sharing any band are candidates. Candidates are then confirmed with the exact
+SequenceMatcher ratio, so every reported match meets the threshold and the
+expensive comparison only runs on a handful of pairs.
+
+The banding trades recall for speed: a pair above the threshold that shares
+no band is never compared, so it is missed. With the settings below that is
+under 1% of pairs just above the threshold on the bench corpus, and none of
+the pairs in merged_gists.json. exact=True compares every earlier signature
+instead, the old pairwise scan, and finds every pair.
+"""
+
+import zlib
+from difflib import SequenceMatcher
+from typing import Any, Iterable
+
+SIMILARITY_THRESHOLD = 0.80
+SHINGLE_SIZE = 4
+NUM_PERM = 64
+# 21 bands of 3 rows (63 of the 64 bins) put the LSH threshold near 0.36
+# Jaccard. Near-duplicates at SIMILARITY_THRESHOLD with a few local edits
+# still share a band (>99% of ratio 0.8-0.9 pairs in tests on the bench
+# corpus). Unrelated signatures rarely do, so candidates per query stay flat
+# as the corpus grows. 2-row bands had a ~0.18 threshold, and candidates grew
+# with the corpus.
+BANDS = 21
+
+_BIN_BITS = NUM_PERM.bit_length() - 1
+_EMPTY = 1 << 32
+
+
+def similarity(a: str, b: str) -> float:
+    """Return similarity ratio between 0 and 1."""
+    if not a and not b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def shingles(sig: str, size: int = SHINGLE_SIZE) -> set[int]:
+    if len(sig) <= size:
+        return {zlib.crc32(sig.encode())}
+    data = sig.encode()
+    return {zlib.crc32(data[i : i + size]) for i in range(len(data) - size + 1)}
+
+
+def minhash(sig: str) -> list[int]:
+    sketch = [_EMPTY] * NUM_PERM
+    for h in shingles(sig):
+        b = h & (NUM_PERM - 1)
+        v = h >> _BIN_BITS
+        if v < sketch[b]:
+            sketch[b] = v
+    # densify: an empty bin borrows from the next filled one so sketches of
+    # short signatures still line up
+    filled = [i for i, v in enumerate(sketch) if v != _EMPTY]
+    if filled and len(filled) < NUM_PERM:
+        for i, v in enumerate(sketch):
+            if v == _EMPTY:
+                j = next((f for f in filled if f > i), filled[0])
+                sketch[i] = sketch[j] + ((j - i) % NUM_PERM << 32)
+    return sketch
+
+
+def bands(sketch: list[int]) -> list[tuple]:
+    rows = NUM_PERM // BANDS
+    return [(b, *sketch[b * rows : (b + 1) * rows]) for b in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """
+    Signatures in insertion order, bucketed by MinHash band. find() returns
+    the earliest added signature whose ratio against `sig` meets the threshold,
+    the same answer a linear scan over every added signature would give for
+    any pair LSH proposes. With exact=True every added signature is a
+    candidate, so it is that linear scan.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, exact: bool = False):
+        self.threshold = threshold
+        self.exact_scan = exact
+        self.sigs: list[str] = []
+        self.keys: list[Any] = []
+        self.exact: dict[str, int] = {}
+        self.buckets: dict[tuple, list[int]] = {}
+        # one matcher per signature, with it as seq2: SequenceMatcher indexes
+        # seq2 once (set_seq2), so a query only pays for set_seq1
+        self.matchers: dict[int, SequenceMatcher] = {}
+
+    def __len__(self) -> int:
+        return len(self.sigs)
+
+    def add(self, sig: str, key: Any = None) -> None:
+        i = len(self.sigs)
+        self.sigs.append(sig)
+        self.keys.append(key)
+        self.exact.setdefault(sig, i)
+        for band in bands(minhash(sig)):
+            self.buckets.setdefault(band, []).append(i)
+
+    def matcher(self, i: int) -> SequenceMatcher:
+        matcher = self.matchers.get(i)
+        if matcher is None:
+            matcher = self.matchers[i] = SequenceMatcher(None, b=self.sigs[i])
+        return matcher
+
+    def find(self, sig: str) -> tuple[float, Any] | None:
+        """
+        Returns:
+            tuple | None: (ratio, key) of the first matching signature.
+        """
+        if not sig:
+            return None
+        first_exact = self.exact.get(sig)
+
+        if self.exact_scan:
+            candidates = range(len(self.sigs))
+        else:
+            found = set()
+            for band in bands(minhash(sig)):
+                found.update(self.buckets.get(band, ()))
+            candidates = sorted(found)
+        for i in candidates:
+            if first_exact is not None and i >= first_exact:
+                return 1.0, self.keys[first_exact]
+            # real_quick_ratio, without building a matcher
+            la, lb = len(sig), len(self.sigs[i])
+            if 2 * min(la, lb) < self.threshold * (la + lb):
+                continue
+            matcher = self.matcher(i)
+            matcher.set_seq1(sig)
+            if matcher.quick_ratio() < self.threshold:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= self.threshold:
+                return ratio, self.keys[i]
+        if first_exact is not None:
+            return 1.0, self.keys[first_exact]
+        return None
+
+
+def find_duplicates(
+    entries: Iterable[tuple[Any, str]],
+    threshold: float = SIMILARITY_THRESHOLD,
+    exact: bool = False,
+) -> list[tuple[float, Any, Any]]:
+    """
+    Walk entries in order. An entry matching an earlier, non-duplicate entry
+    is reported as (ratio, original_key, duplicate_key); otherwise it becomes
+    a candidate original for the entries after it. Empty signatures are
+    skipped. exact=True compares every pair instead of LSH candidates.
+    """
+    index = NearDuplicateIndex(threshold, exact)
+    duplicates = []
+    for key, sig in entries:
+        if not sig:
+            continue
+        matched = index.find(sig)
+        if matched:
+            duplicates.append((matched[0], matched[1], key))
+        else:
+            index.add(sig, key)
+    return duplicates
@@ -0,0 +1,60 @@
+"""
+Single-pass line classifier shared by the gist and comment parsers.
+
+Each line is matched once against one precompiled pattern and tagged as:
+  - HEADING: "#"s at column 0 followed by a space; level = number of "#"s
+  - FENCE:   "```" after optional indentation; text = the language
+  - BULLET:  "- " after optional indentation, with something after it
+  - BLANK:   whitespace only
+  - TEXT:    anything else
+"""
+
+import re
+from enum import Enum
+from typing import Iterable, Iterator, NamedTuple
+
+
+class LineKind(str, Enum):
+    HEADING = "heading"
+    FENCE = "fence"
+    BULLET = "bullet"
+    BLANK = "blank"
+    TEXT = "text"
+
+
+class Token(NamedTuple):
+    kind: LineKind
+    level: int
+    text: str
+    line: str
+
+
+_LINE = re.compile(
+    r"""
+      (?P<blank>\s*$)
+    | (?P<hashes>\#+)\ (?P<heading>.*)
+    | \s*```(?P<fence>.*)
+    | \s*-\ (?=.*\S)(?P<bullet>.*)
+    | (?P<text>)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+def classify(line: str) -> Token:
+    m = _LINE.match(line)
+    kind = m.lastgroup
+    if kind == "heading":
+        return Token(LineKind.HEADING, len(m["hashes"]), m["heading"].strip(), line)
+    if kind == "fence":
+        return Token(LineKind.FENCE, 0, m["fence"].replace("`", "").strip(), line)
+    if kind == "bullet":
+        return Token(LineKind.BULLET, 0, m["bullet"].strip(), line)
+    if kind == "blank":
+        return Token(LineKind.BLANK, 0, "", line)
+    return Token(LineKind.TEXT, 0, line, line)
+
+
+def tokenize(lines: Iterable[str]) -> Iterator[Token]:
+    for line in lines:
+        yield classify(line)
@@ -0,0 +1,200 @@
+"""
+Stage instrumentation. Every stage entry point (prasegist/cli.py) runs under
+instrument(), which records wall/CPU time, peak RSS, bytes read/written and
+the counters of prasegist.shared.counters. write_metrics() dumps the runs as
+JSON and OpenMetrics text next to the human log.
+
+Counters are per thread, but CPU time, peak RSS and I/O are process-wide: for
+stages that overlapped in run_graph they include the other stages' share.
+
+Standard library only, so the CLI can import it before choosing a stage.
+"""
+
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from prasegist.shared.counters import counts, hot
+
+logger = logging.getLogger("app")
+
+METRICS_DIR = Path(os.environ.get("PRASEGIST_METRICS", Path(__file__).parents[2] / "metrics"))
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_bytes: int | None = None
+    bytes_read: int | None = None
+    bytes_written: int | None = None
+    counts: dict[str, int] = field(default_factory=dict)
+    hot: dict[str, int] = field(default_factory=dict)
+
+
+runs: list[StageMetrics] = []
+
+
+def _io_counters() -> dict[str, int] | None:
+    """Bytes this process read and wrote through syscalls (Linux only)."""
+    try:
+        with open("/proc/self/io", "r") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return {"read": int(fields["rchar"]), "written": int(fields["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS mark, so it covers one stage (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss() -> int | None:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # process lifetime peak; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _summary(metrics: StageMetrics) -> str:
+    parts = [f"{metrics.wall_s:.3f}s wall", f"{metrics.cpu_s:.3f}s cpu"]
+    if metrics.peak_rss_bytes is not None:
+        parts.append(f"peak rss {metrics.peak_rss_bytes / 2**20:.1f} MiB")
+    if metrics.bytes_read is not None:
+        parts.append(f"read {metrics.bytes_read / 1024:.0f} KiB")
+        parts.append(f"wrote {metrics.bytes_written / 1024:.0f} KiB")
+    parts.extend(f"{k}={v}" for k, v in {**metrics.counts, **metrics.hot}.items())
+    return ", ".join(parts)
+
+
+@contextmanager
+def instrument(stage: str) -> Iterator[StageMetrics]:
+    metrics = StageMetrics(stage)
+    counts_before, hot_before = Counter(counts.counter()), Counter(hot.counter())
+    io_before = _io_counters()
+    _reset_peak_rss()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield metrics
+    finally:
+        metrics.wall_s = time.perf_counter() - wall
+        metrics.cpu_s = time.process_time() - cpu
+        metrics.peak_rss_bytes = _peak_rss()
+        io_after = _io_counters()
+        if io_before and io_after:
+            metrics.bytes_read = io_after["read"] - io_before["read"]
+            metrics.bytes_written = io_after["written"] - io_before["written"]
+        metrics.counts = dict(counts.counter() - counts_before)
+        metrics.hot = dict(hot.counter() - hot_before)
+        runs.append(metrics)
+        logger.info(f"{stage}: {_summary(metrics)}")
+
+
+def instrumented(stage: str) -> Callable:
+    """Decorator form of instrument()."""
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with instrument(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def counted(items: Iterable, name: str) -> Iterator:
+    """Pass items through, adding how many there were to counts[name]."""
+    n = 0
+    try:
+        for item in items:
+            n += 1
+            yield item
+    finally:
+        counts[name] += n
+
+
+def tally(sections: Iterable) -> Iterator:
+    """
+    Pass section trees (SectionRecords or dicts) through, adding their
+    sections, blocks and block hashes to counts.
+    """
+    for section in sections:
+        stack = [section]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                blocks, children = node["blocks"], node.get("children", [])
+                hashes = sum(len(b.get("hashes") or ()) for b in blocks)
+            else:
+                blocks, children = node.blocks, node.children
+                hashes = sum(len(b.hashes) for b in blocks)
+            counts["sections"] += 1
+            counts["blocks"] += len(blocks)
+            counts["hashes"] += hashes
+            stack.extend(children)
+        yield section
+
+
+def _openmetrics(metrics: list[StageMetrics]) -> str:
+    gauges = {
+        "wall_seconds": "wall_s",
+        "cpu_seconds": "cpu_s",
+        "peak_rss_bytes": "peak_rss_bytes",
+        "read_bytes": "bytes_read",
+        "written_bytes": "bytes_written",
+    }
+    out = []
+    for name, attr in gauges.items():
+        out.append(f"# TYPE prasegist_stage_{name} gauge")
+        for m in metrics:
+            value = getattr(m, attr)
+            if value is not None:
+                out.append(f'prasegist_stage_{name}{{stage="{m.stage}"}} {value}')
+    for kind in ("counts", "hot"):
+        out.append(f"# TYPE prasegist_stage_{kind} gauge")
+        for m in metrics:
+            for key, value in getattr(m, kind).items():
+                out.append(f'prasegist_stage_{kind}{{stage="{m.stage}",name="{key}"}} {value}')
+    out.append("# EOF")
+    return "\n".join(out) + "\n"
+
+
+def write_metrics(directory: Path = METRICS_DIR) -> None:
+    """Write the recorded runs to metrics.json and metrics.prom."""
+    if not runs:
+        return
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "metrics.json", "w", encoding="utf-8") as f:
+            json.dump([asdict(m) for m in runs], f, indent=2)
+        with open(directory / "metrics.prom", "w", encoding="utf-8") as f:
+            f.write(_openmetrics(runs))
+    except (OSError, IOError) as file_err:
+        logger.error(f"Error writing metrics to {directory}: {file_err}")
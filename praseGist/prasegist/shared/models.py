@@ -0,0 +1,45 @@
+"""
+Pydantic models for the section trees and rows. Only needed to validate
+(dump_section(validate=True), make_rows.validate_rows) and by merge; the
+parsers work on the plain records in shared.py.
+"""
+
+from pydantic import BaseModel, Field
+
+from prasegist.shared.shared import BlockEnum
+
+
+class CodeBlock(BaseModel):
+    type: BlockEnum = Field(default=BlockEnum.CODE)
+    lang: str
+    lines: list[str] = Field(default_factory=list)
+    hashes: list[str] = Field(default_factory=list)
+
+
+class TextBlock(BaseModel):
+    type: BlockEnum = Field(default=BlockEnum.TEXT)
+    lines: list[str] = Field(default_factory=list)
+    block_type: BlockEnum = Field(default=BlockEnum.TEXT, exclude=True)
+    hashes: list[str] = Field(default_factory=list)
+
+
+class Section(BaseModel):
+    name: str
+    level: int
+    blocks: list[CodeBlock | TextBlock] = Field(default_factory=list)
+    children: list["Section"] = Field(default_factory=list)
+
+
+class Section1(Section):
+    hashes: set[str] = Field(default_factory=set)
+
+
+SomeSection = Section | Section1
+Snippets = list[CodeBlock | TextBlock]
+
+
+class Row(BaseModel):
+    title: str = Field()
+    tags: list[str] = Field()
+    description: str = Field()
+    blocks: list[TextBlock | CodeBlock] = Field()
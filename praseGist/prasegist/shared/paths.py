@@ -0,0 +1,26 @@
+"""
+Where the pipeline's sources and artifacts live.
+
+Standard library only: the CLI and every stage name their inputs and outputs
+from here without importing the modules that produce them (the network
+modules pull in requests, the models pydantic).
+"""
+
+from pathlib import Path
+
+PACKAGE = Path(__file__).parents[1]
+
+GIST_ID = "c7a6bfca57631a4c45e2c75b7b5f881e"
+GIST_URL = f"https://gist.githubusercontent.com/khansgithub/{GIST_ID}/raw"
+COMMENTS_URL = f"https://api.github.com/gists/{GIST_ID}/comments"
+
+GIST_FILEPATH = PACKAGE / "gist" / "gist.md"
+GIST_PROCESSED = GIST_FILEPATH.with_suffix(".processed.json")
+COMMENTS_FILEPATH = PACKAGE / "comments" / "comments.json"
+COMMENTS_PROCESSED = COMMENTS_FILEPATH.with_suffix(".processed.json")
+MERGED_GISTS = PACKAGE / "merge" / "merged_gists.json"
+ROWS_JSON = PACKAGE / "rows" / "rows.json"
+SNIPPETS_CSV = PACKAGE / "rows" / "snippets.csv"
+BLOCKS_CSV = PACKAGE / "rows" / "blocks.csv"
+INDEX_FILE = PACKAGE / "search" / "search.idx"
+PUBLISHED_FILE = PACKAGE / "db" / "published.json"
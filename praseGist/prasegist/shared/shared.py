@@ -1,63 +1,229 @@
 # ruff: noqa
 
+from __future__ import annotations
+
 from abc import ABC
 from enum import Enum
+from functools import lru_cache
 import hashlib
 import json
-from pydantic import BaseModel, Field
+import re
+
+from prasegist.shared.counters import hot
+
+# The pydantic models live in models.py and are imported on first use, so the
+# parsers (which only build records) never load pydantic. They stay reachable
+# as attributes of this module.
+MODELS = {"CodeBlock", "TextBlock", "Section", "Section1", "SomeSection", "Snippets"}
+
+
+def __getattr__(name: str):
+    if name in MODELS:
+        from prasegist.shared import models
+
+        return getattr(models, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+###########
+# HASHING #
+###########
+# Hash schemes, told apart by digest length:
+#   "md5"       - 32 hex chars, the original scheme (hashStr)
+#   "blake2b64" - 16 hex chars, 64-bit blake2b (current)
+HASH_SCHEME = "blake2b64"
+HASH_LENGTHS = {32: "md5", 16: "blake2b64"}
+
+_WHITESPACE = re.compile(r"\s+")
 
 
 def hashStr(content: str) -> str:
     return hashlib.md5(content.encode()).hexdigest()
 
 
-class BlockEnum(str, Enum):
-    CODE = "code"
-    TEXT = "text"
+def fastHash(content: str) -> str:
+    return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
 
+HASH_FUNCTIONS = {"md5": hashStr, "blake2b64": fastHash}
 
-class CodeBlock(BaseModel):
-    type: BlockEnum = Field(default=BlockEnum.CODE)
-    lang: str
-    lines: list[str] = Field(default_factory=list)
-    hashes: list[str] = Field(default_factory=list)
 
+def hash_scheme(h: str) -> str | None:
+    return HASH_LENGTHS.get(len(h))
 
-class TextBlock(BaseModel):
-    type: BlockEnum = Field(default=BlockEnum.TEXT)
-    lines: list[str] = Field(default_factory=list)
-    block_type: BlockEnum = Field(default=BlockEnum.TEXT, exclude=True)
-    hashes: list[str] = Field(default_factory=list)
-    
 
-class Section(BaseModel):
-    name: str
-    level: int
-    blocks: list[CodeBlock | TextBlock] = Field(default_factory=list)
-    children: list["Section"] = Field(default_factory=list)
+@lru_cache(maxsize=None)
+def section_hash(name: str, scheme: str = HASH_SCHEME) -> str:
+    """Hash of a section name; memoized since it is rehashed per code block."""
+    return HASH_FUNCTIONS[scheme](name)
 
 
-class Section1(Section):
-    hashes: set[str] = Field(default_factory=set)
+class BlockEnum(str, Enum):
+    CODE = "code"
+    TEXT = "text"
+
+
+def block_hash(block: CodeBlock | TextBlock, scheme: str = HASH_SCHEME) -> str:
+    # Removes ALL whitespace (spaces, tabs, newlines) from all lines, concatenates
+    # everything and lowercases it, so formatting-only changes hash the same.
+    if hot.enabled:
+        hot["block_hash.calls"] += 1
+        hot["block_hash.lines"] += len(block.lines)
+    return HASH_FUNCTIONS[scheme](_WHITESPACE.sub("", "".join(block.lines)).lower())
+
+
+def rehash_sections(sections: list[dict], scheme: str = HASH_SCHEME) -> int:
+    """
+    Migrate processed-JSON sections (dicts, as loaded from disk) to `scheme`.
+    Blocks hashed with another scheme are rehashed from their lines, and a
+    top-level "hashes" list holding any old hash is rebuilt the way the gist
+    parser builds it: every block hash, plus the name hash of each section
+    holding a code block.
+    Returns:
+        int: Number of blocks rehashed.
+    """
+
+    def walk(section: dict, acc: set[str]) -> int:
+        count = 0
+        has_code = False
+        for block in section.get("blocks", []):
+            if any(hash_scheme(h) != scheme for h in block.get("hashes", [])):
+                block["hashes"] = [block_hash(TextRecord(block["lines"]), scheme)]
+                count += 1
+            acc.update(block.get("hashes", []))
+            has_code = has_code or block.get("type") == BlockEnum.CODE
+        if has_code:
+            acc.add(section_hash(section["name"], scheme))
+        for child in section.get("children", []):
+            count += walk(child, acc)
+        return count
+
+    rehashed = 0
+    for section in sections:
+        acc: set[str] = set()
+        rehashed += walk(section, acc)
+        hashes = section.get("hashes")
+        if hashes is not None and any(hash_scheme(h) != scheme for h in hashes):
+            section["hashes"] = type(hashes)(acc)
+    return rehashed
+
+
+###########
+# RECORDS #
+###########
+# Lightweight, unvalidated counterparts of the models above, used while
+# parsing. Convert with to_model/from_model, or dump straight to JSON-ready
+# dicts with to_dict (same shape as model_dump(mode="json", by_alias=True)).
+
+
+class CodeRecord:
+    __slots__ = ("lang", "lines", "hashes")
+    type = BlockEnum.CODE
+
+    def __init__(self, lang: str, lines: list[str] | None = None, hashes: list[str] | None = None):
+        self.lang = lang
+        self.lines = lines if lines is not None else []
+        self.hashes = hashes if hashes is not None else []
+
+
+class TextRecord:
+    __slots__ = ("lines", "hashes")
+    type = BlockEnum.TEXT
+
+    def __init__(self, lines: list[str] | None = None, hashes: list[str] | None = None):
+        self.lines = lines if lines is not None else []
+        self.hashes = hashes if hashes is not None else []
+
+
+class SectionRecord:
+    """
+    hashes is a set for sections that become Section1 (top-level gist
+    sections) and None for sections that become plain Section.
+    """
+
+    __slots__ = ("name", "level", "blocks", "children", "hashes")
+
+    def __init__(
+        self,
+        name: str,
+        level: int,
+        blocks: list["BlockRecord"] | None = None,
+        children: list["SectionRecord"] | None = None,
+        hashes: set[str] | None = None,
+    ):
+        self.name = name
+        self.level = level
+        self.blocks = blocks if blocks is not None else []
+        self.children = children if children is not None else []
+        self.hashes = hashes
+
+
+BlockRecord = CodeRecord | TextRecord
+
+
+def block_to_dict(block: BlockRecord) -> dict:
+    if block.type == BlockEnum.CODE:
+        return {"type": "code", "lang": block.lang, "lines": block.lines, "hashes": block.hashes}
+    return {"type": "text", "lines": block.lines, "hashes": block.hashes}
+
+
+def to_dict(section: SectionRecord) -> dict:
+    out = {
+        "name": section.name,
+        "level": section.level,
+        "blocks": [block_to_dict(b) for b in section.blocks],
+        "children": [to_dict(c) for c in section.children],
+    }
+    if section.hashes is not None:
+        out["hashes"] = list(section.hashes)
+    return out
+
+
+def block_to_model(block: BlockRecord) -> CodeBlock | TextBlock:
+    from prasegist.shared.models import CodeBlock, TextBlock
+
+    if block.type == BlockEnum.CODE:
+        return CodeBlock(lang=block.lang, lines=block.lines, hashes=block.hashes)
+    return TextBlock(lines=block.lines, hashes=block.hashes)
+
+
+def to_model(section: SectionRecord) -> SomeSection:
+    from prasegist.shared.models import Section, Section1
+
+    fields = dict(
+        name=section.name,
+        level=section.level,
+        blocks=[block_to_model(b) for b in section.blocks],
+        children=[to_model(c) for c in section.children],
+    )
+    if section.hashes is not None:
+        return Section1(**fields, hashes=section.hashes)
+    return Section(**fields)
 
 
-def block_hash(block: CodeBlock | TextBlock) -> str:
-    # Using "".join([l.strip() for l in block.lines if len(l.strip()) > 0]) removes leading and trailing whitespace (including \t)
-    # from each line, and skips empty (whitespace-only) lines. However, it does NOT remove whitespace inside lines.
-    # If you want to remove ALL whitespace (spaces, tabs, newlines) from all lines and concatenate everything, use:
-    # return hashStr("".join(l for l in block.lines).replace(" ", "").replace("\t", "").replace("\n", ""))
-    # Alternatively, to remove all kinds of whitespace in a more general way:
-    import re
-    return hashStr(re.sub(r"\s+", "", "".join(block.lines)).lower())
+def block_from_model(block: CodeBlock | TextBlock) -> BlockRecord:
+    if block.type == BlockEnum.CODE:
+        return CodeRecord(block.lang, list(block.lines), list(block.hashes))
+    return TextRecord(list(block.lines), list(block.hashes))
 
 
-# if (block.type == BlockEnum.CODE):
-#     return hashStr("".join([l.strip() for l in block.lines if len(l) > 1]))
-# else:
-#     return hashStr("".join(filter(lambda l: len(l) > 0, block.code)))
+def from_model(section: SomeSection) -> SectionRecord:
+    from prasegist.shared.models import Section1
 
-# return hashStr("".join(filter(lambda l: len(l) > 0, block.code)))
+    return SectionRecord(
+        section.name,
+        section.level,
+        [block_from_model(b) for b in section.blocks],
+        [from_model(c) for c in section.children],
+        set(section.hashes) if isinstance(section, Section1) else None,
+    )
 
 
-SomeSection = Section | Section1
-Snippets = list[CodeBlock | TextBlock]
+def dump_section(section: SectionRecord, validate: bool = False) -> dict:
+    """
+    JSON-ready dict for a parsed section. With validate=True the record goes
+    through the pydantic models first.
+    """
+    if validate:
+        return to_model(section).model_dump(mode="json", by_alias=True)
+    return to_dict(section)
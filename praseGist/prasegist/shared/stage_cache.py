@@ -0,0 +1,296 @@
+"""
+Content-addressed cache for the pipeline stages in prasegist/cli.py.
+
+Every stage lists the files it reads and writes. After a stage runs, a
+fingerprint of its inputs (and the digests of its outputs) is stored in
+CACHE_FILE. On the next run a stage whose inputs hash to the same fingerprint,
+and whose outputs are still on disk untouched, is skipped.
+
+File digests are keyed on (mtime, size) so unchanged files are never re-read.
+A stage's own code counts as an input: it names the modules it runs, and the
+source of those modules and of every prasegist module they import, directly
+or not, is hashed with its data files (module_sources).
+
+Stages also name the stages they depend on. run_stages runs a list in order;
+run_graph runs every stage in a thread as soon as its deps are done, so
+independent branches (gist and comments) overlap, and reports the critical
+path: the chain of stages the run actually waited on.
+"""
+
+import ast
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable
+
+CACHE_FILE = Path(__file__).parents[1] / ".stage_cache.json"
+# the directory holding the prasegist package, where module names resolve
+SOURCE_ROOT = Path(__file__).parents[2]
+MISSING = "missing"
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], None]
+    inputs: list[Path] = field(default_factory=list)
+    # dotted names of the modules the stage runs; their sources and those of
+    # the modules they import are inputs too
+    modules: list[str] = field(default_factory=list)
+    outputs: list[Path] = field(default_factory=list)
+    # names of the stages that must finish first; ones not being run are
+    # taken as done, so e.g. gist can name fetch_gist
+    deps: list[str] = field(default_factory=list)
+    # False for stages that always run when asked for (fetch, sync)
+    cached: bool = True
+
+
+def module_sources(modules: list[str], root: Path = SOURCE_ROOT) -> list[Path]:
+    """
+    Source files of `modules` and of every module under `root` they import,
+    transitively, including imports made inside functions. Found by parsing,
+    so nothing gets imported; modules outside `root` (the standard library,
+    third-party packages) are ignored.
+    Returns:
+        list[Path]: The files, sorted.
+    """
+    seen: set[Path] = set()
+    pending = list(modules)
+    while pending:
+        for path in _module_files(pending.pop(), root):
+            if path in seen:
+                continue
+            seen.add(path)
+            try:
+                mtime_ns = path.stat().st_mtime_ns
+            except OSError:
+                continue
+            pending.extend(_imports(path, root, mtime_ns))
+    return sorted(seen)
+
+
+def _module_files(name: str, root: Path) -> list[Path]:
+    """The module's file and the __init__.py of each package above it."""
+    parts = name.split(".")
+    files = [root.joinpath(*parts[:i], "__init__.py") for i in range(1, len(parts))]
+    files.append(root.joinpath(*parts, "__init__.py"))
+    files.append(root.joinpath(*parts).with_suffix(".py"))
+    return [f for f in files if f.is_file()]
+
+
+@lru_cache(maxsize=None)
+def _imports(path: Path, root: Path, mtime_ns: int) -> list[str]:
+    """
+    Names a module imports. `from a import b` yields both a and a.b, since b
+    may be a submodule. Cached per mtime, so the watcher re-parses only files
+    that changed.
+    """
+    try:
+        tree = ast.parse(path.read_bytes(), str(path))
+    except (OSError, SyntaxError):
+        return []
+    package = path.relative_to(root).parent.parts
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = package[: len(package) - node.level + 1] if node.level else ()
+            module = ".".join([*base, *([node.module] if node.module else [])])
+            names.append(module)
+            names.extend(f"{module}.{alias.name}" for alias in node.names)
+    return names
+
+
+class StageCache:
+    def __init__(self, path: Path = CACHE_FILE, root: Path = SOURCE_ROOT):
+        self.path = path
+        self.root = root
+        self.files: dict[str, dict] = {}
+        self.stages: dict[str, dict] = {}
+        # stages running in run_graph share the cache
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.stages = data.get("stages", {})
+        except (OSError, IOError, json.JSONDecodeError):
+            self.files = {}
+            self.stages = {}
+
+    def save(self) -> None:
+        try:
+            with self.lock, open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"files": self.files, "stages": self.stages}, f, indent=2)
+        except (OSError, IOError) as file_err:
+            print(f"Error writing to {self.path}: {file_err}")
+
+    def digest(self, path: Path) -> str:
+        """
+        Content digest of a file. Reuses the cached digest while the file's
+        mtime and size are unchanged.
+        """
+        key = str(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            self.files.pop(key, None)
+            return MISSING
+
+        cached = self.files.get(key)
+        if (
+            cached
+            and cached["mtime_ns"] == stat.st_mtime_ns
+            and cached["size"] == stat.st_size
+        ):
+            return cached["digest"]
+
+        h = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.files[key] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "digest": digest,
+        }
+        return digest
+
+    def fingerprint(self, paths: list[Path]) -> str:
+        h = hashlib.md5()
+        for path in sorted(str(p) for p in paths):
+            h.update(f"{path}:{self.digest(Path(path))}\n".encode())
+        return h.hexdigest()
+
+    def inputs(self, stage: Stage) -> list[Path]:
+        """The stage's data files and the sources of the modules it runs."""
+        return [*stage.inputs, *module_sources(stage.modules, self.root)]
+
+    def is_fresh(self, stage: Stage) -> bool:
+        with self.lock:
+            entry = self.stages.get(stage.name)
+            if entry is None:
+                return False
+            if entry["inputs"] != self.fingerprint(self.inputs(stage)):
+                return False
+            outputs = {str(p): self.digest(p) for p in stage.outputs}
+            return MISSING not in outputs.values() and entry["outputs"] == outputs
+
+    def record(self, stage: Stage) -> None:
+        with self.lock:
+            self.stages[stage.name] = {
+                "inputs": self.fingerprint(self.inputs(stage)),
+                "outputs": {str(p): self.digest(p) for p in stage.outputs},
+            }
+
+
+def run_stages(
+    stages: list[Stage], force: bool = False, cache: StageCache | None = None
+) -> list[str]:
+    """
+    Run stages in order, skipping any whose inputs are unchanged since the
+    last run.
+    Returns:
+        list[str]: Names of the stages that actually ran.
+    """
+    cache = cache or StageCache()
+    return [stage.name for stage in stages if _run_stage(stage, force, cache)]
+
+
+def _run_stage(stage: Stage, force: bool, cache: StageCache) -> bool:
+    """
+    Returns:
+        bool: The stage ran (False when it was skipped).
+    """
+    if stage.cached and not force and cache.is_fresh(stage):
+        # one write, so lines from stages running side by side don't interleave
+        print(f"Skipping {stage.name}: inputs unchanged\n", end="")
+        return False
+    stage.run()
+    if stage.cached:
+        cache.record(stage)
+        cache.save()
+    return True
+
+
+def run_graph(
+    stages: list[Stage],
+    force: bool = False,
+    cache: StageCache | None = None,
+    workers: int | None = None,
+) -> list[str]:
+    """
+    Run each stage in a thread pool as soon as all of its deps are done, and
+    report the critical path. The first stage to raise stops the run once
+    the stages already running have finished.
+    Returns:
+        list[str]: Names of the stages that actually ran, in the order they
+        finished.
+    """
+    cache = cache or StageCache()
+    by_name = {stage.name: stage for stage in stages}
+    waiting = {s.name: {d for d in s.deps if d in by_name} for s in stages}
+    spans: dict[str, tuple[float, float]] = {}
+    ran = []
+
+    def timed(stage: Stage) -> bool:
+        start = time.perf_counter()
+        try:
+            return _run_stage(stage, force, cache)
+        finally:
+            spans[stage.name] = (start, time.perf_counter())
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage") as pool:
+        running = {}
+        while True:
+            for name in [name for name, deps in waiting.items() if not deps]:
+                del waiting[name]
+                running[pool.submit(timed, by_name[name])] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.result():
+                    ran.append(name)
+                for deps in waiting.values():
+                    deps.discard(name)
+    if waiting:
+        raise ValueError(f"Stages with circular deps: {', '.join(waiting)}")
+
+    path = critical_path(stages, spans)
+    if path:
+        steps = " -> ".join(f"{n} {spans[n][1] - spans[n][0]:.3f}s" for n in path)
+        print(f"Critical path: {steps} ({time.perf_counter() - start:.3f}s wall)")
+    return ran
+
+
+def critical_path(
+    stages: list[Stage], spans: dict[str, tuple[float, float]]
+) -> list[str]:
+    """
+    Walk back from the stage that finished last, each time to the dep that
+    finished last before it started, i.e. the one it waited on.
+    Returns:
+        list[str]: Stage names, first to last.
+    """
+    if not spans:
+        return []
+    deps = {s.name: [d for d in s.deps if d in spans] for s in stages}
+    name = max(spans, key=lambda n: spans[n][1])
+    path = [name]
+    while deps[name]:
+        name = max(deps[name], key=lambda n: spans[n][1])
+        path.append(name)
+    return path[::-1]
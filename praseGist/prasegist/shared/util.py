@@ -1,11 +1,66 @@
+import json
+import multiprocessing
+import os
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterable, Iterator
+
 
 def find_duplicates_with_counts(lst):
     counts = Counter(lst)
     return {item: count for item, count in counts.items() if count > 1}
 
+
+def write_json_array(f: IO[str], items: Iterable, indent: int = 4) -> int:
+    """
+    Write items to f as a JSON array, one item at a time, so the whole list
+    never has to be held in memory. Output is byte-identical to
+    json.dump(list(items), f, indent=indent).
+    Returns:
+        int: Number of items written.
+    """
+    pad = " " * indent
+    count = 0
+    for item in items:
+        f.write(",\n" if count else "[\n")
+        f.write(pad + json.dumps(item, indent=indent).replace("\n", "\n" + pad))
+        count += 1
+    f.write("\n]" if count else "[]")
+    return count
+
+
+@contextmanager
+def replacing(path: Path) -> Iterator[Path]:
+    """
+    Yield a temporary path beside `path` to write to, and move it over `path`
+    once the block finishes. Readers see the old file or the new one, never a
+    partial write; on an exception the old file is left as it was.
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def process_pool(workers: int | None = None) -> ProcessPoolExecutor:
+    """
+    A process pool whose workers are not forked from this process. Stages run
+    in threads (stage_cache.run_graph), and a fork taken while another thread
+    holds a lock (logging, I/O) can deadlock the child. forkserver where the
+    platform has it, spawn otherwise.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context(method)
+    )
+
+
 if __name__ == "__main__":
     x = ['d41d8cd98f00b204e9800998ecf8427e', 'bded3c35d2fb1cad3ab09e228fee4de5', 'd41d8cd98f00b204e9800998ecf8427e', 'd89782253800e758145c60c472a0bfb3', 'd41d8cd98f00b204e9800998ecf8427e', '08bc2cabf5b9eb96216a31e77fe080af', 'd41d8cd98f00b204e9800998ecf8427e', '25ddb2d5fc27fd7969e673f1750232aa', '228a50c23b8dcb3809d4f3348ae5299e', '42ed1f127da66b554e69fc1cb8afe9cb', '14e0c02c4b6945b13f6e2df0f5b1fe2b', 'd41d8cd98f00b204e9800998ecf8427e', '599d0757d3794e0818ffc2396c1f2543', 'd41d8cd98f00b204e9800998ecf8427e', '68f3b81c055649c64c180cf9d26a93ba', 'd41d8cd98f00b204e9800998ecf8427e', '789be0472d9b9a8fd6f4da9c5d9ec08b', 'd41d8cd98f00b204e9800998ecf8427e', 'fc0f3d8671f53607cbd26341ec05c2cc', 'd41d8cd98f00b204e9800998ecf8427e', '517c1cf3959810a23d3c80a7e29c8ce1', '6a90197b10c498e35d9ad2a2bc9cef35', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', 'f3fc3dbdf9c8fd9abbf6f06251fccd25', 'd41d8cd98f00b204e9800998ecf8427e', '0b25adef15d4ccd4bb3e692cf6f50024', 'd41d8cd98f00b204e9800998ecf8427e', '4003a7ec1753953a93af116fe2405603', '2d4385cbfa7f017e75bab8d8c27c1de0', '7bfa9ba97c667276e4896e9f7bcd976d', 'd41d8cd98f00b204e9800998ecf8427e', '96a0f0537c2b61f78d30b6a8dc0ba686', 'd41d8cd98f00b204e9800998ecf8427e', 'bfd0281715343e9e19c4ccda69645a4f', 'd41d8cd98f00b204e9800998ecf8427e', '4ebf85478ca5dd1f1db7b1f0e212a881', 'd41d8cd98f00b204e9800998ecf8427e', '4c9a1fcda7edf5b72043c3799c2f2119', '807402806c258f818589b19a783cc5b6', '0a9db264dffd68c8f8b6e591835c526b', 'd41d8cd98f00b204e9800998ecf8427e', '20bd37633c06a3994b65b6fecadb30d2', 'd41d8cd98f00b204e9800998ecf8427e', 'c09359c7b78b3958594b38c9350fd7bd', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', '57236e388a3dd8ad674e57de43e3b99c', 'd41d8cd98f00b204e9800998ecf8427e', '8ef6cb7346951b38abde9181a715b961', 'd41d8cd98f00b204e9800998ecf8427e', '98bc5b6ee4dee7dbf64359457b75822f', 'd41d8cd98f00b204e9800998ecf8427e', '48d63b0c7cb59df48b7faa9814f6788c', 'd41d8cd98f00b204e9800998ecf8427e', 'a218f431d9e25af5b8151d4891e4ebe9', 'd41d8cd98f00b204e9800998ecf8427e', '7222aef74257f1328b1bb8ef46e9f258', 'd41d8cd98f00b204e9800998ecf8427e', 'dcec32ab96afeb3c134551d48c8872c7', 'd41d8cd98f00b204e9800998ecf8427e', '56249a97add56b4fb2458c5036dc686d', 'd41d8cd98f00b204e9800998ecf8427e', 'c47d2c934403d7aa7c76028a347ba0db', 'd41d8cd98f00b204e9800998ecf8427e', '30a32d771a37abe2f39605e55893ed13', '08f7393293d2b3d60616a28816ef4883', 'ebcbf809392267b97bf851585648aed0', 'd41d8cd98f00b204e9800998ecf8427e', 'f434cb08c1ca981de92c3ca17ef9fbaa', 'a786a50dbc28df214d797d0e6e9de10e', 'd41d8cd98f00b204e9800998ecf8427e', 'ffc67b0348cca65428dd1be46dffd436', 'd41d8cd98f00b204e9800998ecf8427e', '37f731a4f3909486a92bf51ff351c68e', '7baf3bd051d34eec24e93a244f176456', 'd41d8cd98f00b204e9800998ecf8427e', '08fafc58b22cadb3c6e2ac8a662ec779', 'd41d8cd98f00b204e9800998ecf8427e', 'a2645e6e2a05a4bb1b019b43550ba1a5', 'd41d8cd98f00b204e9800998ecf8427e', 'ea61a068cd196d69b834034a9c14d64c', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', 'b8fd18cc5ed1a217c4b902aa930657c1', 'd41d8cd98f00b204e9800998ecf8427e', 'd697fb262a66be9b4c3bd0af1fef4797', 'd41d8cd98f00b204e9800998ecf8427e', '3b0e0a0af06f195c932e2438d99755bc', 'd41d8cd98f00b204e9800998ecf8427e', '8b4a3ba0245b5037b042c74b2a429e14', 'd41d8cd98f00b204e9800998ecf8427e', '0fdcaa7a59e63e03a2142126425c181d', 'ed743f9f18556e2754b540c6318a5d74', 'd41d8cd98f00b204e9800998ecf8427e', '33014f026b937035490d3db84fe1e6d5', 'd41d8cd98f00b204e9800998ecf8427e', '54a49a5f1d63b0233fb3f09d4a91c883', 'd41d8cd98f00b204e9800998ecf8427e', '201fda924604951382c74d5d96ec9ad6', 'd41d8cd98f00b204e9800998ecf8427e', 'aa2c034428cfd7b2222ec92c3d84880c', 'd41d8cd98f00b204e9800998ecf8427e', 'f06270ce637911c8ed8f600b6fbdfe4c', 'd41d8cd98f00b204e9800998ecf8427e', '827905758e66024490491a8144ca0498', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', '340c4c8d741686ceb1899ff062cd9cff', 'd41d8cd98f00b204e9800998ecf8427e', 'c62a7fae19f63767a6f5b0e3618c9c85', 'd41d8cd98f00b204e9800998ecf8427e', '584514d7248cd2ed8a80369571560a90', 'd41d8cd98f00b204e9800998ecf8427e', '64b60406dd18a00c58a6068ae6423e97', 'd41d8cd98f00b204e9800998ecf8427e', 'e0032e45313cea4b59989c1164ba81aa', 'd41d8cd98f00b204e9800998ecf8427e', '6f9b1653cc82020f9654608455bc27ad', 'd41d8cd98f00b204e9800998ecf8427e', '8b66e6a834a304b0b8b8a9dcde76f102', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', 'd41d8cd98f00b204e9800998ecf8427e', '62963e14e0ced06bbdf62db63c2e8583', 'd41d8cd98f00b204e9800998ecf8427e', '68a9b1e699b62d096f7cce26eac21937', 'd41d8cd98f00b204e9800998ecf8427e', '88383844ef84941a21e817cf9843b55c', 'd41d8cd98f00b204e9800998ecf8427e', '3b39bf84bcbb83266577685dfc666b43', 'd41d8cd98f00b204e9800998ecf8427e', '819fed59dd883d3cde1329f09bf05bf0', 'd41d8cd98f00b204e9800998ecf8427e', '3fbea7bc7ed23447b574fb294b14ab30', 'd41d8cd98f00b204e9800998ecf8427e', '966da2ba32b2bdb688c09fe462c59c92', 'd41d8cd98f00b204e9800998ecf8427e', '7e78d40087789f39d0bc64c33838aad5', 'd41d8cd98f00b204e9800998ecf8427e', 'b4449c70bfeb230c3a813af759548bf3', 'd41d8cd98f00b204e9800998ecf8427e', '6d5d6a827b03324c080ad25a50337ec8', 'd41d8cd98f00b204e9800998ecf8427e', '0f97759e11671de80886429a689fca78', 'd41d8cd98f00b204e9800998ecf8427e', '3fae49823caeedd62311b88a8b414b45', '7d338ffc96ee77c9a1dad294638e93e7', 'd41d8cd98f00b204e9800998ecf8427e', '7a4a5c8bd22cd0d78728ad081548c9f0', 'd41d8cd98f00b204e9800998ecf8427e', 'f4efb55358d6ae6eda6b77cce541efb7', 'd41d8cd98f00b204e9800998ecf8427e', '842588db029d8295ae05b8302a563a8b', '868b5768ce176ea9161a266f5d100c4b', 'd41d8cd98f00b204e9800998ecf8427e', '267ec517763c8c8ddf755f0c619409b6', 'd41d8cd98f00b204e9800998ecf8427e', 'c938f1756f90d3f507d3ec823d2559f5', 'd41d8cd98f00b204e9800998ecf8427e', '74be722a25e16af9897593dcdb4e731c', 'd41d8cd98f00b204e9800998ecf8427e']
     q = find_duplicates_with_counts(x)
     print(q)
-
@@ -0,0 +1,251 @@
+"""
+Watch mode: a resident pipeline that rebuilds on every change to gist.md or
+comments.json (`prasegist watch`).
+
+The pipeline state stays in memory between changes:
+  gist      the parsed gist sections; when gist.md changes only the top-level
+            sections whose text changed are reparsed (parse_gist_cached)
+  comments  the parsed comment sections, cached by comment body, so only new
+            or edited comments are parsed
+  merged    the merged tree, rebuilt from copies of the two above
+  rows      the row set
+and a change reruns only what is downstream of the file that changed. The
+artifacts are the ones the stages write, each moved into place once complete
+(shared.util.replacing), so readers never see a partial file. Nothing is
+merged or published until both files have loaded once. A step that fails
+keeps its last good state and the watcher carries on. The stage cache is
+updated for the stages that rebuilt, so a later `prasegist run` has nothing
+to do.
+
+Source changes are not picked up; restart the watcher after editing code.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from prasegist.comments.parse_comments import parse_comment_body
+from prasegist.gist.parse_gist import SectionCache, dump_gist, parse_gist_cached
+from prasegist.merge.merge import merge_sections
+from prasegist.rows.make_rows import iter_rows
+from prasegist.rows.rows_to_csv import publish_rows
+from prasegist.shared.columnar import save_sections
+from prasegist.shared.paths import (
+    COMMENTS_FILEPATH,
+    COMMENTS_PROCESSED,
+    GIST_FILEPATH,
+    GIST_PROCESSED,
+    MERGED_GISTS,
+)
+from prasegist.shared.shared import dump_section
+from prasegist.shared.stage_cache import Stage, StageCache
+
+POLL_INTERVAL = 0.25  # seconds between checks
+SETTLE = 0.05  # a changed file must keep its size and mtime this long
+
+logger = logging.getLogger("app.watch")
+
+
+@dataclass
+class WatchedFile:
+    path: Path
+    stamp: tuple[int, int] | None = None  # (mtime_ns, size)
+    digest: str | None = None
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self) -> bool:
+        """Whether the file was touched since the last read."""
+        return self._stat() != self.stamp
+
+    def read(self) -> str | None:
+        """
+        Read the file once a write in progress has settled.
+        Returns:
+            str | None: The text, or None when the content is unchanged.
+        """
+        stamp = self._stat()
+        while True:
+            time.sleep(SETTLE)
+            settled = self._stat()
+            if settled == stamp:
+                break
+            stamp = settled
+        self.stamp = stamp
+        try:
+            data = self.path.read_bytes()
+        except OSError as file_err:
+            logger.error(f"Error reading from {self.path}: {file_err}")
+            return None
+        digest = hashlib.md5(data).hexdigest()
+        if digest == self.digest:
+            return None
+        self.digest = digest
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError as decode_err:
+            logger.error(f"Error decoding {self.path}: {decode_err}")
+            return None
+
+
+def _copy_sections(sections: list[dict]) -> list[dict]:
+    """
+    Copy section trees down to the blocks, the parts merge_sections changes.
+    Lines and hash lists are shared.
+    """
+    return [
+        {
+            **section,
+            "blocks": [dict(block) for block in section["blocks"]],
+            "children": _copy_sections(section.get("children", [])),
+        }
+        for section in sections
+    ]
+
+
+class WarmPipeline:
+    def __init__(self):
+        self.gist: list[dict] = []
+        self.gist_cache = SectionCache()
+        self.comments: list[dict] = []
+        self.comment_cache: dict[str, dict] = {}
+        self.merged: list[dict] = []
+        self.rows: list[dict] = []
+        # inputs that have loaded at least once
+        self.loaded: set[str] = set()
+
+    @property
+    def ready(self) -> bool:
+        """Both inputs have loaded, so merge has what the stages would see."""
+        return {"gist", "comments"} <= self.loaded
+
+    def update_gist(self, text: str) -> None:
+        tree = parse_gist_cached(text.splitlines(keepends=True), self.gist_cache)
+        self.gist = dump_gist(tree)
+        save_sections(self.gist, GIST_PROCESSED)
+        self.loaded.add("gist")
+        logger.info(
+            f"Reparsed {self.gist_cache.parsed} of"
+            f" {self.gist_cache.parsed + self.gist_cache.reused} gist sections"
+        )
+
+    def update_comments(self, text: str) -> bool:
+        """
+        Returns:
+            bool: False when comments.json does not parse; the state is kept.
+        """
+        try:
+            bodies = [comment["body"] for comment in json.loads(text)]
+        except (json.JSONDecodeError, KeyError, TypeError) as json_err:
+            logger.warning(f"Skipping {COMMENTS_FILEPATH}: {json_err}")
+            return False
+        cache = {}
+        for body in bodies:
+            if body not in cache:
+                cached = self.comment_cache.get(body)
+                cache[body] = cached or dump_section(parse_comment_body(body))
+        self.comment_cache = cache
+        self.comments = [cache[body] for body in bodies]
+        save_sections(self.comments, COMMENTS_PROCESSED)
+        self.loaded.add("comments")
+        return True
+
+    def update_merge(self) -> None:
+        # merge_sections works in place, so it gets copies of the warm trees
+        merged = merge_sections(_copy_sections(self.gist), _copy_sections(self.comments))
+        for section in merged:
+            section["hashes"] = list(section["hashes"])
+        self.merged = merged
+        save_sections(self.merged, MERGED_GISTS)
+
+    def update_rows(self) -> None:
+        self.rows = list(iter_rows(self.merged))
+        publish_rows(self.rows)
+
+
+def _attempt(name: str, update: Callable, *args) -> bool:
+    """
+    Run one rebuild step, logging a failure instead of raising.
+    Returns:
+        bool: The step succeeded (False as its result counts as a failure).
+    """
+    try:
+        return update(*args) is not False
+    except Exception:
+        logger.exception(f"Rebuilding {name} failed; keeping the last good state")
+        return False
+
+
+def rebuild(
+    pipeline: WarmPipeline,
+    gist_text: str | None,
+    comments_text: str | None,
+    stages: list[Stage],
+    cache: StageCache,
+) -> None:
+    """Rebuild from whichever file changed and record the stages that rebuilt."""
+    start = time.perf_counter()
+    ran = []
+    if gist_text is not None and _attempt("gist", pipeline.update_gist, gist_text):
+        ran.append("gist")
+    if comments_text is not None and _attempt(
+        "comments", pipeline.update_comments, comments_text
+    ):
+        ran.append("comments")
+    if not ran:
+        return
+    if not pipeline.ready:
+        missing = {"gist", "comments"} - pipeline.loaded
+        logger.warning(f"Not merging until {', '.join(sorted(missing))} loads")
+    elif _attempt("merge", pipeline.update_merge):
+        ran.append("merge")
+        if _attempt("rows", pipeline.update_rows):
+            ran.append("rows")
+
+    # a stage that did not rebuild keeps its old cache entry, so `prasegist
+    # run` still sees it as out of date
+    for stage in stages:
+        if stage.name in ran:
+            cache.record(stage)
+    cache.save()
+    logger.info(
+        f"Rebuilt {', '.join(ran)} in {time.perf_counter() - start:.3f}s"
+        f" ({len(pipeline.rows)} rows)"
+    )
+
+
+def watch(
+    interval: float = POLL_INTERVAL,
+    stages: list[Stage] | None = None,
+    cache: StageCache | None = None,
+) -> None:
+    """Build once, then rebuild on every change until interrupted."""
+    gist_file = WatchedFile(GIST_FILEPATH)
+    comments_file = WatchedFile(COMMENTS_FILEPATH)
+    pipeline = WarmPipeline()
+    cache = cache or StageCache()
+
+    logger.info(f"Watching {GIST_FILEPATH} and {COMMENTS_FILEPATH}")
+    try:
+        while True:
+            gist_text = gist_file.read() if gist_file.changed() else None
+            comments_text = comments_file.read() if comments_file.changed() else None
+            if gist_text is None and comments_text is None:
+                time.sleep(interval)
+                continue
+            try:
+                rebuild(pipeline, gist_text, comments_text, stages or [], cache)
+            except Exception:
+                # the watcher outlives a bad rebuild; the next change retries
+                logger.exception("Rebuild failed; watching for the next change")
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
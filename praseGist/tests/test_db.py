@@ -0,0 +1,139 @@
+"""
+COPY loader against a real Postgres. Skipped unless DATABASE_URL is set; the
+tables are created in a throwaway schema, so nothing outside it is touched.
+"""
+
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("psycopg")
+pytest.importorskip("psycopg_pool")
+
+if "DATABASE_URL" not in os.environ:
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+
+from prasegist.db import load
+from prasegist.db.load import copy_rows, load_rows, reserve_ids
+
+# setup.sql without the trigram indexes, which need the pg_trgm extension
+SCHEMA_SQL = """
+create type block_type as enum ('code', 'text');
+create table snippets (
+  id integer generated always as identity not null unique primary key,
+  title text not null default '',
+  tags text[] not null,
+  description text not null default '',
+  data_flat text not null
+);
+create table blocks (
+  id integer generated always as identity not null primary key,
+  type block_type not null,
+  lang text,
+  lines text[] not null,
+  snippet_id integer not null references snippets (id),
+  pos smallint not null,
+  lines_flat text not null
+);
+create index lines_flat_ts on blocks using gin (to_tsvector('simple', lines_flat));
+create index snippet_flat_ts on snippets using gin (to_tsvector('simple', data_flat));
+"""
+
+ROWS = [
+    {
+        "title": "status",
+        "tags": ["git"],
+        "description": "",
+        "blocks": [
+            {"type": "code", "lang": "bash", "lines": ["git status"]},
+            {"type": "text", "lines": ["short form: -s"]},
+        ],
+    },
+    {
+        "title": "",
+        "tags": ["docker", "compose"],
+        "description": "bring it up",
+        "blocks": [{"type": "code", "lang": "bash", "lines": ["docker compose up -d"]}],
+    },
+    {"title": "empty", "tags": ["misc"], "description": "", "blocks": []},
+]
+
+
+@pytest.fixture
+def conninfo():
+    """DATABASE_URL with search_path pinned to a fresh schema."""
+    schema = f"prasegist_test_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(os.environ["DATABASE_URL"], autocommit=True) as conn:
+        conn.execute(f'create schema "{schema}"')
+    info = make_conninfo(os.environ["DATABASE_URL"], options=f"-c search_path={schema}")
+    with psycopg.connect(info, autocommit=True) as conn:
+        conn.execute(SCHEMA_SQL)
+    yield info
+    pool = load._pools.pop(info, None)
+    if pool is not None:
+        pool.close()
+    with psycopg.connect(os.environ["DATABASE_URL"], autocommit=True) as conn:
+        conn.execute(f'drop schema "{schema}" cascade')
+
+
+def gin_indexes(cur) -> dict[str, str]:
+    cur.execute(
+        "select indexname, indexdef from pg_indexes"
+        " where schemaname = current_schema() and indexdef ilike '%using gin%'"
+    )
+    return dict(cur.fetchall())
+
+
+def test_reserved_ids_are_consecutive_and_not_reused(conninfo):
+    with psycopg.connect(conninfo) as conn, conn.cursor() as cur:
+        first = reserve_ids(cur, 3)
+        second = reserve_ids(cur, 2)
+        assert reserve_ids(cur, 0) == []
+    assert first == list(range(first[0], first[0] + 3))
+    assert second == [first[-1] + 1, first[-1] + 2]
+
+
+def test_copy_rows_fills_both_tables(conninfo):
+    with psycopg.connect(conninfo) as conn, conn.cursor() as cur:
+        ids = copy_rows(cur, ROWS)
+        cur.execute("select id, title, tags, description from snippets order by id")
+        snippets = cur.fetchall()
+        cur.execute("select snippet_id, pos, type, lang, lines from blocks order by id")
+        blocks = cur.fetchall()
+
+    assert list(ids) == [1, 2, 3]
+    assert [s[0] for s in snippets] == list(ids.values())
+    assert [(s[1], s[2], s[3]) for s in snippets] == [
+        (row["title"], row["tags"], row["description"]) for row in ROWS
+    ]
+    assert blocks == [
+        (ids[1], 1, "code", "bash", ["git status"]),
+        (ids[1], 2, "text", None, ["short form: -s"]),
+        (ids[2], 1, "code", "bash", ["docker compose up -d"]),
+    ]
+
+
+def test_load_rows_reseeds_and_restores_the_gin_indexes(conninfo, tmp_path):
+    published = tmp_path / "published.json"
+    with psycopg.connect(conninfo) as conn, conn.cursor() as cur:
+        before = gin_indexes(cur)
+    assert set(before) == {"lines_flat_ts", "snippet_flat_ts"}
+
+    load_rows(ROWS, conninfo=conninfo, published=published)
+    published.write_text("{}")
+    ids = load_rows(ROWS, conninfo=conninfo, published=published)
+
+    # a reseed empties the tables and drops the stale id map
+    assert not published.exists()
+    with psycopg.connect(conninfo) as conn, conn.cursor() as cur:
+        cur.execute("select count(*) from snippets")
+        assert cur.fetchone()[0] == len(ROWS)
+        cur.execute("select count(*) from blocks")
+        assert cur.fetchone()[0] == sum(len(row["blocks"]) for row in ROWS)
+        cur.execute("select id from snippets order by id")
+        assert [r[0] for r in cur.fetchall()] == list(ids.values())
+        assert gin_indexes(cur) == before
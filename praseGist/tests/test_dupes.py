@@ -0,0 +1,71 @@
+"""LSH near-duplicate search against the exact pairwise scan."""
+
+import json
+import random
+import string
+
+import pytest
+
+from check_dupes import MERGED_GISTS, check_dupes
+from prasegist.shared.dupes import SIMILARITY_THRESHOLD, find_duplicates, similarity
+
+
+def near_duplicate_pairs(n: int, seed: int = 0) -> list[tuple[str, str]]:
+    """n unrelated signatures, each with a copy edited to just above the threshold."""
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + " ._-=/"
+    pairs = []
+    while len(pairs) < n:
+        base = "".join(rng.choices(alphabet, k=rng.randint(40, 300)))
+        copy = list(base)
+        while True:
+            i = rng.randrange(len(copy))
+            copy[i : i + rng.randint(1, 4)] = rng.choices(alphabet, k=rng.randint(0, 4))
+            # the orientation find_duplicates compares in: SequenceMatcher
+            # junks popular characters of the second sequence only
+            ratio = similarity("".join(copy), base)
+            if ratio < SIMILARITY_THRESHOLD + 0.1:
+                break
+        if ratio >= SIMILARITY_THRESHOLD:
+            pairs.append((base, "".join(copy)))
+    return pairs
+
+
+def entries(pairs: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    # every original first, then every copy, so a copy is checked against all
+    # the originals
+    originals = [(f"original {i}", base) for i, (base, _) in enumerate(pairs)]
+    copies = [(f"copy {i}", copy) for i, (_, copy) in enumerate(pairs)]
+    return originals + copies
+
+
+def test_same_pairs_as_the_pairwise_scan_on_merged_gists():
+    with open(MERGED_GISTS, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    found = check_dupes(data)
+    assert found
+    assert found == check_dupes(data, exact=True)
+
+
+@pytest.fixture(scope="module")
+def pairs() -> list[tuple[str, str]]:
+    return near_duplicate_pairs(150)
+
+
+@pytest.fixture(scope="module")
+def exact(pairs) -> set[tuple]:
+    return set(find_duplicates(entries(pairs), exact=True))
+
+
+def test_exact_scan_finds_every_pair_at_the_threshold(pairs, exact):
+    assert sorted(dupe for _, _, dupe in exact) == sorted(
+        f"copy {i}" for i in range(len(pairs))
+    )
+
+
+def test_lsh_recall_just_above_the_threshold(pairs, exact):
+    # the documented trade-off: LSH may miss a pair the pairwise scan finds,
+    # but it never reports one the scan would not
+    lsh = set(find_duplicates(entries(pairs)))
+    assert lsh <= exact
+    assert len(lsh) >= 0.97 * len(exact)
@@ -0,0 +1,250 @@
+"""Fetcher against a local http.server: ETag revalidation, Retry-After, paging."""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from prasegist.fetch.fetch import PER_PAGE, Fetcher, cache_key, fetch_all
+
+GIST = "# git\n\n```bash\ngit status\n```\n"
+ETAG = '"gist-v1"'
+
+
+class Server(ThreadingHTTPServer):
+    """Serves the gist at /raw and comments at /comments, logging each request."""
+
+    def __init__(self, comments: list[dict], link: bool = True):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.comments = comments
+        self.link = link
+        # status codes to answer with before the real response, e.g. [429]
+        self.rejections: list[int] = []
+        self.log: list[tuple[str, int, dict]] = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def pages(self) -> list[int]:
+        return sorted(
+            int(parse_qs(urlparse(path).query)["page"][0])
+            for path, _, _ in self.log
+            if path.startswith("/comments")
+        )
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: Server
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        with self.server.lock:
+            rejection = (
+                self.server.rejections.pop(0) if self.server.rejections else None
+            )
+        if rejection is not None:
+            self.reply(rejection, b"", {"Retry-After": "1"})
+        elif url.path == "/raw":
+            if self.headers.get("If-None-Match") == ETAG:
+                self.reply(304, b"", {"ETag": ETAG})
+            else:
+                self.reply(200, GIST.encode(), {"ETag": ETAG})
+        elif url.path == "/comments":
+            self.comment_page(parse_qs(url.query))
+        else:
+            self.reply(404, b"")
+
+    def comment_page(self, query: dict[str, list[str]]):
+        per_page, page = int(query["per_page"][0]), int(query["page"][0])
+        body = self.server.comments[(page - 1) * per_page : page * per_page]
+        headers = {"Content-Type": "application/json", "ETag": f'"page-{page}"'}
+        if self.server.link:
+            last = max(1, -(-len(self.server.comments) // per_page))
+            last_url = f"{self.server.url}/comments?per_page={per_page}&page={last}"
+            headers["Link"] = f'<{last_url}>; rel="last"'
+        if self.headers.get("If-None-Match") == headers["ETag"]:
+            self.reply(304, b"", headers)
+        else:
+            self.reply(200, json.dumps(body).encode(), headers)
+
+    def reply(self, status: int, body: bytes, headers: dict | None = None):
+        with self.server.lock:
+            self.server.log.append((self.path, status, dict(self.headers)))
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_comments(n: int) -> list[dict]:
+    return [{"id": i, "body": f"comment {i}"} for i in range(n)]
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(comments: list[dict] | None = None, link: bool = True) -> Server:
+        server = Server(comments or [], link)
+        thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+        thread.daemon = True
+        thread.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def fetch_gist(server: Server, cache_path) -> str | None:
+    async def run():
+        fetcher = Fetcher(cache_path=cache_path)
+        try:
+            return await fetcher.fetch_gist(f"{server.url}/raw")
+        finally:
+            fetcher.close()
+
+    return asyncio.run(run())
+
+
+def fetch_comments(
+    server: Server, cache_path, concurrency: int = 8, since: str | None = None
+):
+    async def run():
+        fetcher = Fetcher(concurrency, cache_path)
+        try:
+            return await fetcher.fetch_comments(f"{server.url}/comments", since)
+        finally:
+            fetcher.close()
+
+    return asyncio.run(run())
+
+
+def test_unchanged_gist_is_revalidated_with_its_etag(serve, tmp_path):
+    server = serve()
+    cache_path = tmp_path / "fetch_cache.json"
+
+    assert fetch_gist(server, cache_path) == GIST
+    assert json.loads(cache_path.read_text())[f"{server.url}/raw"]["etag"] == ETAG
+
+    # a new fetcher reads the ETag back from the cache file
+    assert fetch_gist(server, cache_path) == GIST
+    (_, first, first_headers), (_, second, second_headers) = server.log
+    assert (first, second) == (200, 304)
+    assert "If-None-Match" not in first_headers
+    assert second_headers["If-None-Match"] == ETAG
+
+
+def test_retry_after_pauses_then_retries(serve, tmp_path):
+    server = serve()
+    server.rejections = [429]
+    fetcher = Fetcher(cache_path=tmp_path / "fetch_cache.json")
+
+    started = time.time()
+    assert asyncio.run(fetcher.fetch_gist(f"{server.url}/raw")) == GIST
+    fetcher.close()
+
+    assert [status for _, status, _ in server.log] == [429, 200]
+    assert fetcher.resume_at >= started + 1
+    assert time.time() >= fetcher.resume_at
+
+
+def test_rejected_until_retries_run_out(serve, tmp_path):
+    server = serve()
+    server.rejections = [403, 403, 403]
+    fetcher = Fetcher(cache_path=tmp_path / "fetch_cache.json")
+    # Retry-After is honoured between attempts; skip the waits
+    fetcher.update_rate_limit = lambda resp: resp.status_code == 403
+
+    assert asyncio.run(fetcher.fetch_gist(f"{server.url}/raw")) is None
+    assert len(server.log) == 3
+    assert not fetcher.updated
+
+
+def test_comments_paged_from_the_link_header(serve, tmp_path):
+    comments = make_comments(2 * PER_PAGE + 50)
+    server = serve(comments)
+
+    assert fetch_comments(server, tmp_path / "fetch_cache.json") == comments
+    assert server.pages() == [1, 2, 3]
+
+
+def test_comments_paged_in_batches_without_a_link_header(serve, tmp_path):
+    comments = make_comments(3 * PER_PAGE + 1)
+    server = serve(comments, link=False)
+
+    fetched = fetch_comments(server, tmp_path / "fetch_cache.json", concurrency=2)
+    assert fetched == comments
+    # batches of two pages until one comes back short
+    assert server.pages() == [1, 2, 3, 4, 5]
+
+
+def test_exact_page_multiple_stops_on_an_empty_page(serve, tmp_path):
+    comments = make_comments(PER_PAGE)
+    server = serve(comments, link=False)
+
+    assert (
+        fetch_comments(server, tmp_path / "fetch_cache.json", concurrency=1) == comments
+    )
+    assert server.pages() == [1, 2]
+
+
+def test_fetch_all_revalidates_every_page(serve, tmp_path):
+    comments = make_comments(PER_PAGE + 1)
+    server = serve(comments)
+    cache_path = tmp_path / "fetch_cache.json"
+    urls = f"{server.url}/raw", f"{server.url}/comments"
+
+    first = asyncio.run(fetch_all(*urls, cache_path=cache_path))
+    assert first == [GIST, comments]
+    server.log.clear()
+
+    # every 304 is answered from the cached body
+    second = asyncio.run(fetch_all(*urls, cache_path=cache_path))
+    assert second == [GIST, comments]
+    assert [status for _, status, _ in server.log] == [304, 304, 304]
+
+
+def test_cache_key_drops_the_since_watermark():
+    url = "https://api.github.com/gists/x/comments"
+    assert cache_key(f"{url}?per_page=100&page=2&since=2024-01-01T00%3A00%3A00Z") == (
+        f"{url}?per_page=100&page=2"
+    )
+    assert cache_key(url) == url
+
+
+def test_syncs_replace_the_page_entry_instead_of_adding_one(serve, tmp_path):
+    comments = make_comments(PER_PAGE + 1)
+    server = serve(comments)
+    cache_path = tmp_path / "fetch_cache.json"
+
+    for since in ["2024-01-01T00:00:00Z", "2024-02-01T00:00:00Z", None]:
+        assert fetch_comments(server, cache_path, since=since) == comments
+
+    page = f"{server.url}/comments?per_page={PER_PAGE}&page="
+    assert sorted(json.loads(cache_path.read_text())) == [f"{page}1", f"{page}2"]
+    # each sync revalidated what the one before it stored
+    assert [status for _, status, _ in server.log[2:]] == [304] * 4
+
+
+def test_entries_under_a_since_url_are_evicted_on_save(serve, tmp_path):
+    server = serve(make_comments(1))
+    cache_path = tmp_path / "fetch_cache.json"
+    stale = f"{server.url}/comments?per_page={PER_PAGE}&page=1&since=2024"
+    cache_path.write_text(json.dumps({stale: {"etag": None, "body": "[]"}}))
+
+    fetch_comments(server, cache_path, since="2024-03-01T00:00:00Z")
+    assert list(json.loads(cache_path.read_text())) == [cache_key(stale)]
@@ -0,0 +1,164 @@
+"""Dedup semantics of merge.merge_sections (MergeIndex)."""
+
+from prasegist.merge.merge import merge_sections
+from prasegist.shared.shared import TextRecord, block_hash
+
+
+def code(*lines: str, lang: str = "bash") -> dict:
+    return {"type": "code", "lang": lang, "lines": list(lines), "hashes": []}
+
+
+def text(*lines: str) -> dict:
+    return {"type": "text", "lines": list(lines), "hashes": []}
+
+
+def hashed(block: dict) -> dict:
+    """The block as the parsers write it, with its own hash."""
+    return {**block, "hashes": [block_hash(TextRecord(block["lines"]))]}
+
+
+def section(
+    name: str, *blocks: dict, children: list[dict] | None = None, level: int = 1
+) -> dict:
+    out = {
+        "name": name,
+        "level": level,
+        "blocks": list(blocks),
+        "children": children or [],
+    }
+    if level == 1:
+        # a top-level section's hashes cover its whole subtree
+        out["hashes"] = [h for block in walk_blocks(out) for h in block["hashes"]]
+    return out
+
+
+def comment(tag: str, *blocks: dict) -> dict:
+    return {"name": tag, "level": 1, "blocks": list(blocks), "children": []}
+
+
+def walk_blocks(node: dict) -> list[dict]:
+    blocks = list(node["blocks"])
+    for child in node.get("children", []):
+        blocks.extend(walk_blocks(child))
+    return blocks
+
+
+def merged_lines(sections: list[dict], name: str) -> list[list[str]]:
+    found = [s for s in sections if s["name"] == name]
+    assert len(found) == 1
+    return [block["lines"] for block in walk_blocks(found[0])]
+
+
+def test_new_block_is_kept_in_a_section_that_has_other_hashes():
+    # merge used to test the target section's hashes instead of the block's
+    # own, dropping every comment block merged into a non-empty section
+    gists = [section("git", hashed(code("git status")))]
+    merged = merge_sections(gists, [comment("git", hashed(code("git log --oneline")))])
+    assert merged_lines(merged, "git") == [["git status"], ["git log --oneline"]]
+
+
+def test_block_without_hashes_is_hashed_from_its_lines():
+    gists = [section("git", hashed(code("git status")))]
+    merged = merge_sections(
+        gists, [comment("git", code("git stash"), code("git status"))]
+    )
+    assert merged_lines(merged, "git") == [["git status"], ["git stash"]]
+    assert block_hash(TextRecord(["git stash"])) in merged[0]["hashes"]
+
+
+def test_exact_duplicate_of_another_section_is_dropped():
+    gists = [
+        section("git", hashed(code("git status"))),
+        section("bash", hashed(code("ls -la"))),
+    ]
+    merged = merge_sections(gists, [comment("git", hashed(code("ls -la")))])
+    assert merged_lines(merged, "git") == [["git status"]]
+    assert merged_lines(merged, "bash") == [["ls -la"]]
+
+
+def test_duplicate_ignores_whitespace_and_case():
+    gists = [section("git", hashed(code("git status")))]
+    merged = merge_sections(gists, [comment("git", hashed(code("  GIT   status ")))])
+    assert merged_lines(merged, "git") == [["git status"]]
+
+
+def test_duplicate_across_comments_keeps_the_first():
+    gists = [section("git", hashed(code("git status")))]
+    comments = [
+        comment("git", hashed(code("git fetch --all"))),
+        comment("bash", hashed(code("git fetch --all"))),
+    ]
+    merged = merge_sections(gists, comments)
+    assert merged_lines(merged, "git") == [["git status"], ["git fetch --all"]]
+    assert merged_lines(merged, "bash") == []
+
+
+def test_text_blocks_are_deduplicated_like_code():
+    gists = [section("git", hashed(text("rebase onto main")))]
+    merged = merge_sections(gists, [comment("git", hashed(text("rebase onto main")))])
+    assert merged_lines(merged, "git") == [["rebase onto main"]]
+
+
+def test_unknown_tag_creates_a_top_level_section():
+    gists = [section("git", hashed(code("git status")))]
+    merged = merge_sections(
+        gists,
+        [comment("docker", hashed(code("docker ps")), hashed(code("git status")))],
+    )
+    assert [s["name"] for s in merged] == ["git", "docker"]
+    docker = merged[1]
+    assert docker["level"] == 1
+    assert docker["blocks"] == []
+    # the comment, minus its duplicate block, is the only child
+    assert [child["name"] for child in docker["children"]] == ["docker"]
+    assert merged_lines(merged, "docker") == [["docker ps"]]
+    assert docker["hashes"] == {block_hash(TextRecord(["docker ps"]))}
+
+
+def test_later_comments_merge_into_a_created_section():
+    comments = [
+        comment("docker", hashed(code("docker ps"))),
+        comment("docker", hashed(code("docker images")), hashed(code("docker ps"))),
+    ]
+    merged = merge_sections([], comments)
+    assert len(merged) == 1
+    # the first comment is the section's child, later ones add to the section
+    assert [b["lines"] for b in merged[0]["children"][0]["blocks"]] == [["docker ps"]]
+    assert [b["lines"] for b in merged[0]["blocks"]] == [["docker images"]]
+
+
+def test_tag_naming_a_nested_section_merges_into_it():
+    pytest_section = section("pytest", hashed(code("pytest -x")), level=2)
+    gists = [
+        section(
+            "python", hashed(code("python -m venv .venv")), children=[pytest_section]
+        )
+    ]
+    merged = merge_sections(gists, [comment("pytest", hashed(code("pytest -k name")))])
+    assert [s["name"] for s in merged] == ["python"]
+    assert [b["lines"] for b in merged[0]["children"][0]["blocks"]] == [
+        ["pytest -x"],
+        ["pytest -k name"],
+    ]
+    # the hash is claimed by the top-level section
+    assert block_hash(TextRecord(["pytest -k name"])) in merged[0]["hashes"]
+
+
+def test_tag_aliases_map_to_the_gist_section():
+    gists = [section("vs code", hashed(code("code .")))]
+    merged = merge_sections(gists, [comment("VSCode", hashed(code("code --diff a b")))])
+    assert merged_lines(merged, "vs code") == [["code ."], ["code --diff a b"]]
+
+
+def test_fuzzy_drops_near_duplicate_code():
+    original = "docker run --rm -it -v $(pwd):/src -w /src node:20 npm test"
+    gists = [section("docker", hashed(code(original)))]
+    near = hashed(code(original.replace("node:20", "node:22")))
+    assert merged_lines(merge_sections(gists, [comment("docker", near)]), "docker") == [
+        [original],
+        near["lines"],
+    ]
+
+    gists = [section("docker", hashed(code(original)))]
+    merged = merge_sections(gists, [comment("docker", near)], fuzzy=True)
+    assert merged_lines(merged, "docker") == [[original]]
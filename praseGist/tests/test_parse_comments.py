@@ -0,0 +1,44 @@
+"""parse_comments across a process pool matches the serial parse."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from prasegist.comments.parse_comments import (
+    FILEPATH,
+    _extract_body,
+    load_comments,
+    parse_comments,
+)
+from prasegist.shared.shared import dump_section
+
+ROOT = Path(__file__).parents[1]
+
+
+def test_pooled_parse_matches_serial():
+    comments = _extract_body(load_comments())
+    # more bodies than one chunk, so the pool really is used
+    assert len(comments) > 8, f"{FILEPATH} is too small to need a pool"
+
+    serial = [dump_section(s) for s in parse_comments(comments, workers=1)]
+    pooled = [dump_section(s) for s in parse_comments(comments, workers=2, chunksize=8)]
+    assert pooled == serial
+
+
+def test_workers_read_from_the_environment():
+    def workers(value: str) -> str:
+        env = {**os.environ, "PRASEGIST_COMMENTS_WORKERS": value}
+        code = "from prasegist.comments.parse_comments import WORKERS; print(WORKERS)"
+        proc = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        return proc.stdout.strip()
+
+    assert workers("4") == "4"
+    # 0 means every core
+    assert workers("0") == "None"
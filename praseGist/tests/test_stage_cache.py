@@ -0,0 +1,86 @@
+"""Stage cache keys: a stage reruns when any module it imports changes."""
+
+from pathlib import Path
+
+from prasegist.cli import STAGES
+from prasegist.shared.paths import PACKAGE
+from prasegist.shared.stage_cache import Stage, StageCache, module_sources, run_stages
+
+SOURCES = {
+    "app/__init__.py": "",
+    "app/parse.py": (
+        "from app.shared.util import helper\n"
+        "from . import helpers\n"
+        "\n"
+        "def run():\n"
+        "    from app.shared import lines\n"
+    ),
+    "app/helpers.py": "",
+    "app/shared/__init__.py": "",
+    "app/shared/util.py": "import json\n",
+    "app/shared/lines.py": "",
+    "app/shared/unused.py": "",
+}
+
+
+def write_package(root: Path) -> None:
+    for name, source in SOURCES.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+
+
+def make_stage(root: Path, runs: list[str]) -> Stage:
+    data, output = root / "data.txt", root / "out.txt"
+    data.write_text("data")
+
+    def run():
+        runs.append("parse")
+        output.write_text(data.read_text())
+
+    return Stage("parse", run, inputs=[data], modules=["app.parse"], outputs=[output])
+
+
+def test_module_sources_follow_imports_transitively(tmp_path):
+    write_package(tmp_path)
+    found = {
+        p.relative_to(tmp_path).as_posix()
+        for p in module_sources(["app.parse"], tmp_path)
+    }
+    # function-level and relative imports count; the standard library and
+    # modules nothing imports do not
+    assert found == set(SOURCES) - {"app/shared/unused.py"}
+
+
+def test_editing_an_imported_module_reruns_the_stage(tmp_path):
+    write_package(tmp_path)
+    runs: list[str] = []
+    stage = make_stage(tmp_path, runs)
+
+    def run() -> list[str]:
+        return run_stages([stage], cache=StageCache(tmp_path / "cache.json", tmp_path))
+
+    assert run() == ["parse"]
+    assert run() == []
+
+    (tmp_path / "app/shared/unused.py").write_text("x = 1\n")
+    assert run() == []
+
+    (tmp_path / "app/shared/lines.py").write_text("KINDS = ()\n")
+    assert run() == ["parse"]
+    assert run() == []
+    assert runs == ["parse", "parse"]
+
+
+def test_pipeline_stages_cover_the_shared_modules_they_import():
+    sources = {
+        s.name: {p.relative_to(PACKAGE).as_posix() for p in module_sources(s.modules)}
+        for s in STAGES
+    }
+    shared = {"shared/lines.py", "shared/models.py", "shared/util.py"}
+    assert shared <= sources["gist"]
+    assert shared <= sources["comments"]
+    assert {"shared/dupes.py", "shared/counters.py"} <= sources["merge"]
+    assert {"search/search.py", "shared/paths.py"} <= sources["rows"]
+    # a stage's inputs are what it imports, not the whole tree
+    assert "comments/parse_comments.py" not in sources["gist"]
@@ -0,0 +1,50 @@
+"""
+The CLI defers every stage and heavy dependency to the command that needs it
+(see prasegist/cli.py). Each case runs in a fresh interpreter, as
+bench/startup.py does, and checks sys.modules afterwards.
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from bench.startup import CASES
+
+ROOT = Path(__file__).parents[1]
+HEAVY = {"pandas", "psycopg", "requests", "pydantic", "rich"}
+STAGES = {
+    "prasegist.gist.parse_gist",
+    "prasegist.comments.parse_comments",
+    "prasegist.merge.merge",
+    "prasegist.rows.make_rows",
+    "prasegist.rows.rows_to_csv",
+    "prasegist.fetch.fetch",
+    "prasegist.db.load",
+    "prasegist.watch",
+}
+
+
+def loaded_modules(code: str) -> set[str]:
+    code += "\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    assert proc.returncode == 0, proc.stderr
+    return set(json.loads(proc.stdout.splitlines()[-1]))
+
+
+def test_help_loads_no_stage_and_no_heavy_package():
+    modules = loaded_modules(CASES["help"][0])
+    assert "prasegist.cli" in modules
+    assert not HEAVY & {name.split(".")[0] for name in modules}
+    assert not STAGES & modules
+
+
+@pytest.mark.parametrize("case", [name for name in CASES if name != "help"])
+def test_stage_imports_stay_within_their_budget(case):
+    code, forbidden = CASES[case]
+    modules = loaded_modules(code)
+    assert not (forbidden | {"pandas"}) & {name.split(".")[0] for name in modules}
@@ -0,0 +1,119 @@
+"""Differential publish: row keys, diff_rows and the published.json bookkeeping."""
+
+import copy
+
+from prasegist.db import sync
+from prasegist.db.sync import diff_rows, load_published, row_fingerprint, row_keys
+
+
+def row(tags: list[str], title: str, *lines: str, description: str = "") -> dict:
+    return {
+        "tags": tags,
+        "title": title,
+        "description": description,
+        "blocks": [{"type": "code", "lang": "bash", "lines": [line]} for line in lines],
+    }
+
+
+ROWS = [
+    row(["git"], "status", "git status"),
+    row(["git"], "log", "git log --oneline", "git log -p"),
+    row(["git", "stash"], "", "git stash"),
+    row(["git", "stash"], "", "git stash pop"),
+    row(["docker"], "ps", "docker ps -a"),
+]
+
+
+def published_from(rows: list[dict]) -> dict[str, dict]:
+    """published.json as a sync of `rows` leaves it, with ids 1..n."""
+    return {
+        key: {"id": i, "fingerprint": row_fingerprint(r)}
+        for i, (key, r) in enumerate(row_keys(rows).items(), start=1)
+    }
+
+
+def test_repeated_titles_get_an_ordinal():
+    keys = list(row_keys(ROWS))
+    assert len(set(keys)) == len(ROWS)
+    assert keys[2].endswith("#0") and keys[3].endswith("#1")
+    assert keys[2][:-2] == keys[3][:-2]
+
+
+def test_unchanged_rows_give_an_empty_diff():
+    diff = diff_rows(row_keys(copy.deepcopy(ROWS)), published_from(ROWS))
+    assert not diff
+
+
+def test_edited_block_is_one_update_that_keeps_the_id():
+    rows = copy.deepcopy(ROWS)
+    rows[1]["blocks"][1]["lines"] = ["git log --stat"]
+    diff = diff_rows(row_keys(rows), published_from(ROWS))
+    assert not diff.inserts and not diff.deletes
+    [(key, snippet_id, updated)] = diff.updates
+    assert snippet_id == 2
+    assert updated is rows[1]
+    assert key == list(row_keys(rows))[1]
+
+
+def test_reordered_blocks_are_an_update():
+    rows = copy.deepcopy(ROWS)
+    rows[1]["blocks"].reverse()
+    diff = diff_rows(row_keys(rows), published_from(ROWS))
+    assert [snippet_id for _, snippet_id, _ in diff.updates] == [2]
+
+
+def test_reordered_sibling_rows_are_not_a_change():
+    # rows are keyed by tags + title, not position, so moving a row is free
+    rows = [ROWS[4], ROWS[1], ROWS[0], ROWS[2], ROWS[3]]
+    assert not diff_rows(row_keys(rows), published_from(ROWS))
+
+
+def test_reordered_rows_with_the_same_title_swap_content():
+    # same tags and title: the ordinal is the identity, so swapping the two
+    # rows updates both in place rather than deleting and inserting
+    rows = [ROWS[0], ROWS[1], ROWS[3], ROWS[2], ROWS[4]]
+    diff = diff_rows(row_keys(rows), published_from(ROWS))
+    assert not diff.inserts and not diff.deletes
+    assert [(snippet_id, r) for _, snippet_id, r in diff.updates] == [
+        (3, ROWS[3]),
+        (4, ROWS[2]),
+    ]
+
+
+def test_removed_snippet_is_a_delete():
+    rows = ROWS[:1] + ROWS[2:]
+    diff = diff_rows(row_keys(rows), published_from(ROWS))
+    assert not diff.inserts and not diff.updates
+    assert diff.deletes == [(list(row_keys(ROWS))[1], 2)]
+
+
+def test_new_and_retitled_rows():
+    rows = copy.deepcopy(ROWS)
+    rows[0]["title"] = "status -s"
+    rows.append(row(["docker"], "images", "docker images"))
+    diff = diff_rows(row_keys(rows), published_from(ROWS))
+    # a new title is a new identity: the old row goes, the new one comes
+    assert [r["title"] for _, r in diff.inserts] == ["status -s", "images"]
+    assert [snippet_id for _, snippet_id in diff.deletes] == [1]
+    assert not diff.updates
+
+
+def test_reseed_replaces_published_json(tmp_path, monkeypatch):
+    path = tmp_path / "published.json"
+    path.write_text('{"stale": {"id": 99, "fingerprint": "x"}}')
+
+    def load_rows(rows, conninfo, published):
+        # the real load_rows truncates the tables and drops the stale map
+        published.unlink(missing_ok=True)
+        return {idx: 100 + idx for idx, _ in enumerate(rows, start=1)}
+
+    monkeypatch.setattr(sync, "load_rows", load_rows)
+    keyed = row_keys(ROWS)
+    ids = sync.reseed(keyed, conninfo="unused", path=path)
+
+    published = load_published(path)
+    assert "stale" not in published
+    assert [entry["id"] for entry in published.values()] == list(ids.values())
+    assert list(published) == list(keyed)
+    # the next publish sees nothing to do
+    assert not diff_rows(keyed, published)